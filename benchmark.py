@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+# benchmarks for graph.py.
+#
+# builds seeded random graphs of a few shapes and sizes and times the main algorithms on them, along with how much
+# the peak memory of the process grew while each one ran.  every case runs in its own forked process, so the
+# peak memory of one case doesn't hide that of the next, and the peak is reset once the case's input is built, so
+# the setup doesn't hide it either (on linux; other systems can't reset it, so small peaks there show as 0).
+#
+#   ./benchmark.py                          run everything, compare against the stored baseline
+#   ./benchmark.py --sizes 1000,10000       only some sizes
+#   ./benchmark.py --save                   store the results as the new baseline
+#
+# the exit status is 1 if any case got slower than the baseline by more than --tolerance.
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import graph
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+
+##########    ##########    ##########    ##########    ##########
+# seeded edge lists, from the generators in graph.py.  each returns (origin, terminus, cost) tuples over the
+# labels 0 .. n-1.
+
+def _labelled(g):
+    return [(a.label, b.label, cost) for a, b, cost in g.arcs()]
+
+
+def erdos_renyi(n, seed, degree=8):
+    # G(n, m) with m chosen for the given average degree
+    return _labelled(graph.gnm(n, n * degree // 2, maxcost=100, seed=seed))
+
+
+def grid(n, seed):
+    # square lattice with about n nodes
+    side = max(1, int(n ** 0.5))
+    return _labelled(graph.gridgraph(side, side, maxcost=100, seed=seed))
+
+
+def power_law(n, seed, m=3):
+    return _labelled(graph.barabasi_albert(n, m, maxcost=100, seed=seed))
+
+
+GENERATORS = {
+    'erdos_renyi': erdos_renyi,
+    'grid': grid,
+    'power_law': power_law,
+}
+
+
+##########    ##########    ##########    ##########    ##########
+# the cases.  each takes the edge list and returns a function that does the work being timed.
+
+def _build(edges):
+    return graph.UGraph.fromedges(edges, nodes=[0])
+
+
+def case_addedge(edges):
+    def run():
+        g = graph.UGraph()
+        nodes = {}
+        for a, b, cost in edges:
+            for x in (a, b):
+                if x not in nodes:
+                    nodes[x] = graph.Node(x)
+                    g.addnode(nodes[x])
+            g.addedge(nodes[a], nodes[b], cost)
+    return run
+
+
+def case_addedges(edges):
+    return lambda: _build(edges)
+
+
+def case_dfs(edges):
+    g = _build(edges)
+    return lambda: graph.dfs(g, graph.Node(0))
+
+
+def case_bfs(edges):
+    g = _build(edges)
+    return lambda: graph.bfs(g, graph.Node(0))
+
+
+def case_getpartitions(edges):
+    g = _build(edges)
+    return lambda: graph.getpartitions(g)
+
+
+def case_dijkstra(edges):
+    g = _build(edges)
+    return lambda: g.dijkstra(graph.Node(0))
+
+
+def case_kruskal(edges):
+    g = _build(edges)
+    return lambda: graph.kruskal(g)
+
+
+CASES = [
+    ('addedge', case_addedge),
+    ('addedges', case_addedges),
+    ('dfs', case_dfs),
+    ('bfs', case_bfs),
+    ('getpartitions', case_getpartitions),
+    ('dijkstra', case_dijkstra),
+    ('kruskal', case_kruskal),
+]
+
+
+##########    ##########    ##########    ##########    ##########
+
+
+def _maxrss_kb():
+    # linux reports kilobytes, os x reports bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def _peak_kb():
+    # the process's peak resident size.  on linux, VmHWM can be reset with _resetpeak; elsewhere this is ru_maxrss,
+    # which can't, so the peak of the setup hides any smaller peak of the timed step.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return _maxrss_kb()
+
+
+def _resetpeak():
+    # bring the peak resident size down to the current one (linux only; a no-op elsewhere)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except IOError:
+        pass
+
+
+def _runcase(conn, setup, generator, size, seed):
+    run = setup(GENERATORS[generator](size, seed))
+    _resetpeak()
+    before = _peak_kb()
+    start = time.time()
+    run()
+    elapsed = time.time() - start
+    conn.send((elapsed, _peak_kb() - before))
+    conn.close()
+
+
+def measure(setup, generator, size, seed):
+    # run one case in a child process, returning (seconds, peak memory growth in kB)
+    parent, child = multiprocessing.Pipe(False)
+    p = multiprocessing.Process(target=_runcase, args=(child, setup, generator, size, seed))
+    p.start()
+    result = parent.recv()
+    p.join()
+    return result
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='benchmark graph.py')
+    parser.add_argument('--sizes', default=','.join(str(x) for x in DEFAULT_SIZES),
+                        help='comma-separated node counts (default: %(default)s)')
+    parser.add_argument('--generators', default=','.join(sorted(GENERATORS)),
+                        help='comma-separated graph shapes (default: %(default)s)')
+    parser.add_argument('--cases', default=','.join(name for name, _ in CASES),
+                        help='comma-separated algorithms (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=12345)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file (default: %(default)s)')
+    parser.add_argument('--save', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown against the baseline, as a fraction (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    sizes = [int(x) for x in args.sizes.split(',')]
+    generators = args.generators.split(',')
+    cases = args.cases.split(',')
+    setups = dict(CASES)
+    for name in generators:
+        if name not in GENERATORS:
+            parser.error('unknown generator %s' % name)
+    for name in cases:
+        if name not in setups:
+            parser.error('unknown case %s' % name)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    print '%-14s %-12s %9s %10s %11s %10s' % ('case', 'graph', 'nodes', 'seconds', 'peak kB', 'baseline')
+    for size in sizes:
+        for generator in generators:
+            for name in cases:
+                elapsed, peak = measure(setups[name], generator, size, args.seed)
+                key = '%s/%s/%d' % (name, generator, size)
+                results[key] = {'seconds': elapsed, 'peak_kb': peak}
+
+                note = ''
+                if key in baseline:
+                    before = baseline[key]['seconds']
+                    note = '%+.0f%%' % (100.0 * (elapsed - before) / before) if before else ''
+                    if elapsed > before * (1 + args.tolerance) and elapsed - before > 0.01:
+                        regressions.append(key)
+                        note += ' SLOWER'
+                print '%-14s %-12s %9d %10.3f %11d %10s' % (name, generator, size, elapsed, peak, note)
+                sys.stdout.flush()
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True, separators=(',', ': '))
+            f.write('\n')
+        print 'saved baseline to %s' % args.baseline
+
+    if regressions:
+        print '%d regression(s):  %s' % (len(regressions), ', '.join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
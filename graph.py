@@ -1,16 +1,135 @@
-from pprint import pprint, pformat
+from pprint import pprint
+from array import array
+import binascii
 import collections
+import contextlib
+import cPickle as pickle
+import functools
+import gc
+import heapq
+import itertools
+import math
+import mmap
+import multiprocessing
+import operator
+import os
 import random
+import struct
+import time
+import weakref
 
 class GraphException(Exception):
     pass
 
 
+class CycleException(GraphException):
+    # raised by the DAG algorithms when the graph has a cycle.  cycle is a list of nodes around one of them, with
+    # the first node repeated at the end.
+
+    def __init__(self, message, cycle):
+        super(CycleException, self).__init__(message)
+        self.cycle = cycle
+
+
+def _pausegc(f):
+    # bulk loading allocates millions of tuples, and the cyclic garbage collector keeps rescanning all of them as
+    # they pile up.  none of them can be part of a cycle, so keep the collector off while f runs.
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            if enabled:
+                gc.enable()
+    return wrapper
+
+
+##########    ##########    ##########    ##########    ##########
+# instrumentation.  when an observer is installed, the algorithms that support it call it once per run as
+# observer(name, counters, seconds), where counters is a dict of operation counts for that run (nodes settled,
+# edges scanned, heap pushes, sorts, unions; which ones depends on the algorithm).  with no observer installed,
+# the only cost is one test of _observer at the start and end of each call; the counts are worked out afterwards
+# from the data structures the algorithm built anyway, not kept up in the inner loops.
+
+_observer = None
+
+
+def instrument(observer):
+    # install observer, or turn instrumentation off with None.  returns the observer that was installed before.
+    global _observer
+    previous, _observer = _observer, observer
+    return previous
+
+
+@contextlib.contextmanager
+def instrumented(observer=None):
+    '''
+    run the body with observer installed, restoring the previous one afterwards.  if observer is None, a new Stats
+    is used.  yields the observer.
+    '''
+    if observer is None:
+        observer = Stats()
+    previous = instrument(observer)
+    try:
+        yield observer
+    finally:
+        instrument(previous)
+
+
+class Stats(object):
+    '''
+    observer that adds up what it's told:  calls[name] is the number of runs of name, seconds[name] their total
+    wall time, and counters[name] a Counter of their operation counts.
+    '''
+
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.seconds = collections.Counter()
+        self.counters = collections.defaultdict(collections.Counter)
+
+    def __call__(self, name, counters, seconds):
+        self.calls[name] += 1
+        self.seconds[name] += seconds
+        self.counters[name].update(counters)
+
+    def clear(self):
+        self.calls.clear()
+        self.seconds.clear()
+        self.counters.clear()
+
+    def report(self):
+        # one line per algorithm, slowest first
+        lines = []
+        for name, seconds in self.seconds.most_common():
+            counts = ', '.join('%s=%d' % x for x in sorted(self.counters[name].items()))
+            lines.append('%-16s %6d calls %10.6fs  %s' % (name, self.calls[name], seconds, counts))
+        return '\n'.join(lines)
+
+
 class Node(object):
+    __slots__ = ('_label', '__weakref__')
+
+    # label -> Node, for Node.intern
+    _interned = weakref.WeakValueDictionary()
 
     def __init__(self, label):
         self._label = label
 
+    @classmethod
+    def intern(cls, label):
+        # return the Node for label, sharing one object between everyone who asks for the same label for as long
+        # as any of them holds on to it.
+        n = cls._interned.get(label)
+        if n is None:
+            n = cls(label)
+            cls._interned[label] = n
+        return n
+
+    def __reduce__(self):
+        return (Node, (self._label,))
+
     def __str__(self):
         return '%s' % self._label
 
@@ -44,6 +163,8 @@ class Node(object):
 
 
 class Edge(object):
+    __slots__ = ('_origin', '_terminus', '_cost')
+
     def __init__(self, origin, terminus, cost):
         self._origin = origin
         self._terminus = terminus
@@ -52,6 +173,9 @@ class Edge(object):
     def __str__(self):
         return "(%s - %s - %s)" % (self._origin, self._cost, self._terminus)
 
+    def __reduce__(self):
+        return (Edge, (self._origin, self._terminus, self._cost))
+
     def __hash__(self):
         return hash((self.origin, self.terminus, self.cost))
 
@@ -76,13 +200,37 @@ class Edge(object):
 
 class DGraph(object):
     '''
-    directed graph.
+    directed graph.  multiedges says what adding an edge that's already there does:  'allow' adds another one
+    alongside it, 'min' keeps whichever is cheaper, 'last' gives the existing one the new cost, and 'reject'
+    raises GraphException.
     '''
     # implemented as a dictionary that maps nodes to lists of
     # tuples:  (Node, cost) which indicate the cost of the path.
 
-    def __init__(self):
+    MULTIEDGE_POLICIES = ('allow', 'min', 'last', 'reject')
+
+    def __init__(self, multiedges='allow'):
+        if multiedges not in self.MULTIEDGE_POLICIES:
+            raise GraphException("unknown multi-edge policy %s" % multiedges)
         self.adj_list = {}
+        self._multiedges = multiedges
+        # node -> {terminus: index in adj_list[node] of the arc to it}, for hasedge, edgecost and the multi-edge
+        # policies.  with parallel arcs, the index is that of the cheapest.  filled in on demand, like _sorted.
+        self._arcmaps = {}
+        # bumped by everything that changes the graph; see the version property
+        self._version = 0
+        # node -> its neighbors sorted by label.  filled in on demand, and an entry is dropped whenever its node
+        # gets a new edge.
+        self._sorted = {}
+        # number of neighbor lists sorted so far, for the instrumentation
+        self._sorts = 0
+        # DisjointSet kept up to date by addnode/addedge, once trackcomponents() has been called
+        self._components = None
+        # node -> list of (predecessor, cost), the mirror image of adj_list.  built on demand by
+        # _reverseadjacency and thrown away whenever an edge is added, unless trackpredecessors() has been called, in
+        # which case everything that changes the graph keeps it up to date instead.
+        self._reverse = None
+        self._trackreverse = False
 
     def __nonzero__(self):
         # returns true if the graph has > 0 nodes
@@ -92,10 +240,25 @@ class DGraph(object):
         # returns the number of nodes in the graph.
         return len(self.adj_list)
 
+    @property
+    def multiedges(self):
+        return self._multiedges
+
+    @property
+    def version(self):
+        # a counter that goes up every time the graph is modified.  anything computed from the graph can remember
+        # the version it saw, and knows it's out of date if the version has moved on.
+        return self._version
+
     def addnode(self, n):
         if n in self.adj_list:
             raise GraphException("node %s is already in the graph" % n)
         self.adj_list[n] = list()
+        self._version += 1
+        if self._reverse is not None:
+            self._reverse[n] = []
+        if self._components is not None:
+            self._components.add(n)
 
     def addnodes(self, *nodes):
         for n in nodes:
@@ -114,12 +277,350 @@ class DGraph(object):
         if b not in self.adj_list:
             raise GraphException("terminus %s not in graph" % b)
 
+        arcs = self.adj_list[a]
+        if self._multiedges == 'allow':
+            arcmap = self._arcmaps.get(a)
+            if arcmap is not None and (b not in arcmap or cost < arcs[arcmap[b]][1]):
+                arcmap[b] = len(arcs)
+        else:
+            arcmap = self._arcmap(a)
+            i = arcmap.get(b)
+            if i is not None:
+                self._replacearc(a, b, cost, i)
+                return
+            arcmap[b] = len(arcs)
+
         edge = (b, cost)
-        self.adj_list[a].append(edge)
+        arcs.append(edge)
+        self._version += 1
+        self._sorted.pop(a, None)
+        if self._trackreverse:
+            self._reverse[b].append((a, cost))
+        else:
+            self._reverse = None
+        if self._components is not None:
+            self._components.union(a, b)
+
+    @_pausegc
+    def addedges(self, edges):
+        '''
+        add many edges at once.  edges is an iterable of (origin, terminus) or (origin, terminus, cost) tuples,
+        cost defaulting to 1.  endpoints that aren't in the graph yet are added to it, and anything that isn't a
+        Node is taken to be the label of one.  the edges are all checked before any of them is added.
+        '''
+        edges = _checkedges(edges)
+        if self._multiedges == 'allow':
+            self._addarcs(self._expandarcs(edges))
+            return
+
+        arcs, repeats = self._mergeedges(edges)
+        self._addarcs(arcs)
+        for a, b, cost in repeats:
+            self.addedge(a, b, cost)
+
+    def _mergeedges(self, edges):
+        # apply the multi-edge policy to a batch of checked edges.  returns (arcs, repeats):  arcs are for
+        # _addarcs, with at most one edge per pair of nodes not yet joined, and repeats are the edges between nodes
+        # that already are, to go through addedge.  under 'reject', raises before anything has been added.
+        policy = self._multiedges
+        adj_list = self.adj_list
+        new = []
+        repeats = []
+        for a, b, cost in edges:
+            if a in adj_list and b in self._arcmap(a):
+                if policy == 'reject':
+                    raise GraphException("edge from %s to %s already in graph" % (a, b))
+                repeats.append((a, b, cost))
+            else:
+                new.append((a, b, cost))
+        return self._mergearcs(new, policy), repeats
+
+    @classmethod
+    def _mergearcs(cls, edges, policy):
+        # the arcs for a batch of checked edges between nodes not yet joined, keeping one edge per pair of nodes
+        # as policy (anything but 'allow') says
+        merged = collections.OrderedDict()
+        for a, b, cost in edges:
+            key = cls._edgekey(a, b)
+            if key in merged:
+                if policy == 'reject':
+                    raise GraphException("edge from %s to %s given twice" % (a, b))
+                if policy == 'min' and merged[key][2] <= cost:
+                    continue
+            merged[key] = (a, b, cost)
+
+        # a self-loop is its own reverse, so keep it out of _expandarcs
+        edges = list(merged.values())
+        arcs = cls._expandarcs([e for e in edges if e[0] != e[1]])
+        arcs.extend(e for e in edges if e[0] == e[1])
+        return arcs
+
+    @staticmethod
+    def _edgekey(a, b):
+        # what identifies an edge, for the multi-edge policies
+        return a, b
+
+    def hasedge(self, a, b):
+        # whether there's an edge from a to b
+        if a not in self.adj_list:
+            raise GraphException("origin %s not in graph" % a)
+        return b in self._arcmap(a)
+
+    def edgecost(self, a, b):
+        # the cost of the edge from a to b.  with parallel edges, the cheapest.
+        if a not in self.adj_list:
+            raise GraphException("origin %s not in graph" % a)
+        i = self._arcmap(a).get(b)
+        if i is None:
+            raise GraphException("no edge from %s to %s" % (a, b))
+        return self.adj_list[a][i][1]
+
+    def _arcmap(self, a):
+        # returns the cached entry of _arcmaps for a, building it if need be
+        try:
+            return self._arcmaps[a]
+        except KeyError:
+            arcmap = self._arcmaps[a] = self._indexarcs(self.adj_list[a])
+            return arcmap
+
+    @staticmethod
+    def _indexarcs(arcs):
+        # map each terminus in a list of arcs to the index of the cheapest arc to it
+        arcmap = {}
+        for i, arc in enumerate(arcs):
+            j = arcmap.get(arc[0])
+            if j is None or arc[1] < arcs[j][1]:
+                arcmap[arc[0]] = i
+        return arcmap
+
+    def _replacearc(self, a, b, cost, i):
+        # addedge found an arc from a to b at adj_list[a][i] already, and the policy isn't 'allow'
+        if self._multiedges == 'reject':
+            raise GraphException("edge from %s to %s already in graph" % (a, b))
+        old = self.adj_list[a][i][1]
+        if self._multiedges == 'min' and old <= cost:
+            return
+
+        self.adj_list[a][i] = (b, cost)
+        self._version += 1
+        if self._trackreverse:
+            inarcs = self._reverse[b]
+            for j, arc in enumerate(inarcs):
+                if arc[0] == a:
+                    inarcs[j] = (a, cost)
+        else:
+            self._reverse = None
+
+    @classmethod
+    def fromedges(cls, edges, nodes=(), multiedges='allow'):
+        '''
+        build a graph from an iterable of edges, as for addedges.  nodes lists extra (e.g. isolated) nodes.
+        '''
+        g = cls(multiedges)
+        g.addnodes(*[_asnode(n) for n in nodes])
+        g.addedges(edges)
+        return g
+
+    @staticmethod
+    def _expandarcs(arcs):
+        # turn a list of checked (origin, terminus, cost) edges into the arcs that go in adj_list
+        return arcs
+
+    @classmethod
+    @_pausegc
+    def _fromindexed(cls, labels, arcs):
+        # quick way for the generators to build a graph:  labels are all distinct, and the arcs are
+        # (origin, terminus, cost) with the ends given as indexes into labels.  only hashes each node once.
+        nodes = [Node(x) for x in labels]
+        arclists = [[] for _ in nodes]
+        for a, b, cost in cls._expandarcs(arcs):
+            arclists[a].append((nodes[b], cost))
+        g = cls()
+        g.adj_list.update(itertools.izip(nodes, arclists))
+        g._version += 1
+        return g
+
+    def _addarcs(self, arcs):
+        # bulk version of addedge, minus the membership checks
+        adj_list = self.adj_list
+        newnodes = []
+        for a, b, cost in arcs:
+            arclist = adj_list.get(a)
+            if arclist is None:
+                arclist = adj_list[a] = []
+                newnodes.append(a)
+            if b not in adj_list:
+                adj_list[b] = []
+                newnodes.append(b)
+            arclist.append((b, cost))
+
+        self._version += 1
+        self._sorted.clear()
+        self._arcmaps.clear()
+        if self._trackreverse:
+            reverse = self._reverse
+            for n in newnodes:
+                reverse[n] = []
+            for a, b, cost in arcs:
+                reverse[b].append((a, cost))
+        else:
+            self._reverse = None
+        if self._components is not None:
+            for n in newnodes:
+                self._components.add(n)
+            for a, b, cost in arcs:
+                self._components.union(a, b)
+
+    def removeedge(self, a, b, cost=None):
+        '''
+        remove the edges from a to b.  if cost is given, only the ones with that cost are removed.
+        '''
+        self._removearcs(a, b, cost)
+        self._arcsremoved([a])
+
+    def removenode(self, n):
+        '''
+        remove n and every edge into or out of it.
+        '''
+        if n not in self.adj_list:
+            raise GraphException("node %s not in graph" % n)
+
+        preds = self._inneighbors(n)
+        preds.discard(n)
+        for u in preds:
+            self.adj_list[u][:] = [arc for arc in self.adj_list[u] if arc[0] != n]
+        if self._trackreverse:
+            reverse = self._reverse
+            for terminus in set(arc[0] for arc in self.adj_list[n]):
+                if terminus != n:
+                    reverse[terminus][:] = [arc for arc in reverse[terminus] if arc[0] != n]
+            del reverse[n]
+        del self.adj_list[n]
+        self._sorted.pop(n, None)
+        self._arcmaps.pop(n, None)
+        self._arcsremoved(preds)
+
+    def updatecost(self, a, b, cost):
+        '''
+        give every edge from a to b the new cost.
+        '''
+        self._setcost(a, b, cost)
+        self._version += 1
+        if not self._trackreverse:
+            self._reverse = None
+
+    def _removearcs(self, a, b, cost):
+        if a not in self.adj_list:
+            raise GraphException("origin %s not in graph" % a)
+        if b not in self.adj_list:
+            raise GraphException("terminus %s not in graph" % b)
+
+        arcs = self.adj_list[a]
+        keep = [arc for arc in arcs if not (arc[0] == b and (cost is None or arc[1] == cost))]
+        if len(keep) == len(arcs):
+            raise GraphException("no edge from %s to %s" % (a, b))
+        arcs[:] = keep
+        if self._trackreverse:
+            inarcs = self._reverse[b]
+            inarcs[:] = [arc for arc in inarcs if not (arc[0] == a and (cost is None or arc[1] == cost))]
+
+    def _setcost(self, a, b, cost):
+        if a not in self.adj_list:
+            raise GraphException("origin %s not in graph" % a)
+        if b not in self.adj_list:
+            raise GraphException("terminus %s not in graph" % b)
+
+        arcs = self.adj_list[a]
+        found = False
+        for i, arc in enumerate(arcs):
+            if arc[0] == b:
+                arcs[i] = (b, cost)
+                found = True
+        if not found:
+            raise GraphException("no edge from %s to %s" % (a, b))
+        if self._trackreverse:
+            inarcs = self._reverse[b]
+            for i, arc in enumerate(inarcs):
+                if arc[0] == a:
+                    inarcs[i] = (a, cost)
+
+    def _inneighbors(self, n):
+        # the set of nodes with an edge into n.  a full scan, unless the reverse index happens to be built.
+        if self._reverse is not None:
+            return set(u for u, cost in self._reverse[n])
+        return set(u for u in self.adj_list if any(arc[0] == n for arc in self.adj_list[u]))
+
+    def _arcsremoved(self, origins):
+        # bookkeeping once arcs out of the given nodes are gone
+        self._version += 1
+        for n in origins:
+            self._sorted.pop(n, None)
+            self._arcmaps.pop(n, None)
+        if not self._trackreverse:
+            self._reverse = None
+        if self._components is not None:
+            # union-find can't split sets, so start over
+            self._components.clear()
+            self._fillcomponents()
 
     def dump(self):
         pprint(self.adj_list)
 
+    def trackcomponents(self):
+        '''
+        start keeping the (weakly) connected components of this graph in a DisjointSet that addnode and addedge
+        update as they go.  returns that DisjointSet; use its find, connected and count to ask about components.
+        removing edges or nodes rebuilds it from scratch.
+        '''
+        if self._components is None:
+            self._components = DisjointSet()
+            self._fillcomponents()
+        return self._components
+
+    def trackpredecessors(self):
+        '''
+        start keeping an index of every node's in-edges, which everything that changes the graph updates as it goes.
+        predecessors, indegree, reversed and bidijkstra use it; without it, they rebuild it with a scan of the
+        whole graph whenever the graph has changed since they last looked.
+        '''
+        self._reverseadjacency()
+        self._trackreverse = True
+
+    def predecessors(self, n):
+        # like neighbors, but for the nodes with an edge into n
+        if not self.contains(n):
+            raise GraphException("node %s not in graph" % n)
+
+        for k in sorted([x[0] for x in self._reverseadjacency()[n]], key=lambda k: k._label):
+            yield k
+
+    def indegree(self, n):
+        # the number of edges into n
+        if not self.contains(n):
+            raise GraphException("node %s not in graph" % n)
+        return len(self._reverseadjacency()[n])
+
+    def reversed(self):
+        '''
+        read-only view of this graph with every edge turned around, for searching backwards along in-edges:  e.g.
+        dfs(g.reversed(), n) finds everything that can reach n, and g.reversed().dijkstra(n) the distances to n.
+        '''
+        return ReverseView(self)
+
+    def _fillcomponents(self):
+        components = self._components
+        for n in self.nodes():
+            components.add(n)
+        for n in self.nodes():
+            for arc in self.adj_list[n]:
+                components.union(n, arc[0])
+
+    def compact(self):
+        '''
+        return a frozen copy of this graph that keeps its edges in compressed-sparse-row arrays.
+        '''
+        return CompactDGraph.fromgraph(self)
+
     '''
     return the nodes in the graph, as a list
     '''
@@ -131,57 +632,307 @@ class DGraph(object):
         if not self.contains(n):
             raise GraphException("node %s not in graph" % n)
 
-        sorted_neighbors = sorted(self.adj_list[n], key=lambda n: n[0]._label)
-        for k in sorted_neighbors:
-            yield k[0]
+        for k in self._sortedneighbors(n):
+            yield k
+
+    def _sortedneighbors(self, n):
+        # returns the cached list of n's neighbors, sorted by label.  callers must not modify it.
+        try:
+            return self._sorted[n]
+        except KeyError:
+            result = sorted([x[0] for x in self.adj_list[n]], key=lambda k: k._label)
+            self._sorted[n] = result
+            self._sorts += 1
+            return result
 
     def edges(self):
+        for a, b, cost in self.arcs():
+            yield Edge(a, b, cost)
+
+    def arcs(self):
+        # like edges, but yields plain (origin, terminus, cost) tuples instead of building an Edge for each
         for n in self.nodes():
-            for arc in self.adj_list[n]:
-                yield Edge(n, arc[0], arc[1])
+            for terminus, cost in self.adj_list[n]:
+                yield n, terminus, cost
 
-    def dijkstra(self, n):
-        # single-source shortest pair problem
+    def dijkstra(self, n, target=None):
+        '''
+        single-source shortest paths from n.  returns a pair of dicts (dist, pred):  dist maps every node reachable
+        from n to its distance from n, pred maps every one of those nodes except n to its predecessor on a shortest
+        path.  if target is given, stop as soon as its distance is known; the result then only covers the nodes
+        settled so far.
+        '''
         if n not in self.adj_list:
             raise GraphException("node %s not in graph" % n)
 
-        bigs = set([n])
-        #print "S: %s" % bigs
-        bigv = {k for k in self.adj_list.keys()}
-        diff = bigv - bigs
-
-        # construct dict mapping (origin, terminus) to cost
-        bigc = {}
-        for e in self.edges():
-            bigc[(e.origin, e.terminus)] = e.cost
-        #print "bigc:  %s" % pformat(bigc)
-        bigd = {x: None for x in diff}
-        for x in self.adj_list[n]:
-            if (n, x[0]) in bigc:
-                bigd[x[0]] = bigc[(n, x[0])]
-
-        while len(bigs) < len(self):
-            # find the node in diff where v (cost) is minimum
-
-            x = filter(lambda x: bigd[x] is not None, diff)
-            x = [(i, bigd[i]) for i in x]
-            #print pformat(x)
-            w, mincost = min(x, key=lambda x: x[1])
-            #print w, mincost
-            diff.remove(w)
-            bigs.add(w)
-            #print "S: %s" % bigs
-            for v in diff:
-                if (w, v) not in bigc:
+        observer = _observer
+        if observer is not None:
+            start = time.time()
+
+        adj_list = self.adj_list
+        dist = {}
+        tentative = {n: 0}
+        pred = {}
+
+        # heap entries are (distance, sequence, node).  the sequence number breaks ties so that nodes are never
+        # compared, and stale entries (for nodes already settled) are skipped when popped.
+        heap = [(0, 0, n)]
+        pushes = 1
+        while heap:
+            d, _, w = heapq.heappop(heap)
+            if w in dist:
+                continue
+            dist[w] = d
+            if target is not None and w == target:
+                break
+
+            for v, cost in adj_list[w]:
+                if v in dist:
                     continue
+                nd = d + cost
+                if v not in tentative or nd < tentative[v]:
+                    tentative[v] = nd
+                    pred[v] = w
+                    heapq.heappush(heap, (nd, pushes, v))
+                    pushes += 1
+
+        if target is not None:
+            # we may have stopped early; drop predecessors of nodes that were never settled
+            pred = dict((v, pred[v]) for v in dist if v in pred)
+        if observer is not None:
+            relaxed = _degreesum(adj_list, dist)
+            if target is not None and target in dist:
+                # the target was settled but not expanded
+                relaxed -= len(adj_list[target])
+            observer('dijkstra', {'settled': len(dist), 'relaxed': relaxed, 'pushes': pushes}, time.time() - start)
+        return dist, pred
+
+    def repairdijkstra(self, n, dist, pred, changed):
+        '''
+        bring the result (dist, pred) of an earlier dijkstra(n) up to date after some edges changed, without
+        starting over.  changed lists the (origin, terminus) pairs whose edges were added, removed or given new
+        costs since; a removed node only needs to appear in one of them.  returns the repaired (dist, pred) and
+        leaves the originals alone.
+
+        the work done is in proportion to the part of the tree that changed, except that removed nodes cost a
+        pass over pred, and that without trackpredecessors() the in-edge index is rebuilt by a scan of the
+        graph on the first repair after each change.
+        '''
+        # in the style of ramalingam & reps:  nodes whose shortest-path-tree branch went through an edge that got
+        # more expensive or went away lose their distances, get the best offer from their unaffected predecessors,
+        # and a dijkstra-ordered propagation (which also picks up edges that got cheaper) fixes up the rest.
+        if n not in self.adj_list:
+            raise GraphException("node %s not in graph" % n)
 
-                if not bigd[v]:
-                    bigd[v] = bigd[w] + bigc[(w, v)]
+        adj_list = self.adj_list
+        dist = dict(dist)
+        pred = dict(pred)
+        changed = [(a, b) for a, b, _ in self._expandarcs([(a, b, None) for a, b in changed])]
+
+        def cheapest(a, b):
+            costs = [arc[1] for arc in adj_list[a] if arc[0] == b]
+            return min(costs) if costs else None
+
+        # roots of the branches of the tree that are no longer valid:  removed nodes, and the termini of tree edges
+        # that got more expensive or went away
+        roots = []
+        for a, b in changed:
+            roots.extend(v for v in (a, b) if v in dist and v not in adj_list)
+            if a in adj_list and b in pred and pred[b] == a:
+                cost = cheapest(a, b)
+                if cost is None or dist[a] + cost > dist[b]:
+                    roots.append(b)
+
+        # everything below the roots goes too.  a node's children are among the termini of its arcs, except for
+        # removed nodes, whose arcs are gone; their children are found with one pass over pred.
+        affected = set()
+        orphans = None
+        stack = roots
+        while stack:
+            v = stack.pop()
+            if v in affected:
+                continue
+            affected.add(v)
+            if v in adj_list:
+                stack.extend(w for w, _ in adj_list[v] if w in pred and pred[w] == v)
+                continue
+            if orphans is None:
+                orphans = {}
+                for w, p in pred.items():
+                    if p not in adj_list:
+                        orphans.setdefault(p, []).append(w)
+            stack.extend(orphans.get(v, ()))
+        for v in affected:
+            del dist[v]
+            pred.pop(v, None)
+
+        heap = []
+        pushes = 0
+        if affected:
+            reverse = self._reverseadjacency()
+            for v in affected:
+                if v not in adj_list:
                     continue
+                for u, cost in reverse[v]:
+                    if u in dist and (v not in dist or dist[u] + cost < dist[v]):
+                        dist[v] = dist[u] + cost
+                        pred[v] = u
+                if v in dist:
+                    heapq.heappush(heap, (dist[v], pushes, v))
+                    pushes += 1
+
+        for a, b in changed:
+            if a in dist and b in adj_list:
+                cost = cheapest(a, b)
+                if cost is not None and (b not in dist or dist[a] + cost < dist[b]):
+                    dist[b] = dist[a] + cost
+                    pred[b] = a
+                    heapq.heappush(heap, (dist[b], pushes, b))
+                    pushes += 1
+
+        while heap:
+            d, _, w = heapq.heappop(heap)
+            if dist[w] < d:
+                continue
+            for v, cost in adj_list[w]:
+                nd = d + cost
+                if v not in dist or nd < dist[v]:
+                    dist[v] = nd
+                    pred[v] = w
+                    heapq.heappush(heap, (nd, pushes, v))
+                    pushes += 1
+
+        return dist, pred
+
+    def shortestpath(self, a, b):
+        '''
+        return (cost, path) for a cheapest path from a to b, where path is a list of nodes starting with a and
+        ending with b.  if b can't be reached from a, return (None, []).
+        '''
+        if b not in self.adj_list:
+            raise GraphException("node %s not in graph" % b)
 
-                bigd[v] = min(bigd[v], bigd[w] + bigc[(w, v)])
+        dist, pred = self.dijkstra(a, target=b)
+        if b not in dist:
+            return None, []
+        return dist[b], getpath(pred, b)
 
-        print "d: %s" % pformat(bigd)
+    def bidijkstra(self, a, b):
+        '''
+        like shortestpath, but searches forward from a and backward from b at the same time, stopping once the two
+        searches can't find anything better than the best path seen so far.
+        '''
+        for n in (a, b):
+            if n not in self.adj_list:
+                raise GraphException("node %s not in graph" % n)
+        if a == b:
+            return 0, [a]
+
+        observer = _observer
+        if observer is not None:
+            start = time.time()
+
+        # index 0 is the forward search from a, index 1 the backward search from b
+        adj = (self.adj_list, self._reverseadjacency())
+        dist = ({a: 0}, {b: 0})
+        pred = ({}, {})
+        settled = (set(), set())
+        heaps = ([(0, 0, a)], [(0, 0, b)])
+        pushes = 1
+        best = None
+        meet = None
+
+        while heaps[0] and heaps[1]:
+            if best is not None and heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+
+            # advance whichever search has the nearer frontier
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            d, _, w = heapq.heappop(heaps[side])
+            if w in settled[side]:
+                continue
+            settled[side].add(w)
+
+            mydist = dist[side]
+            otherdist = dist[1 - side]
+            for v, cost in adj[side][w]:
+                nd = d + cost
+                if v not in mydist or nd < mydist[v]:
+                    mydist[v] = nd
+                    pred[side][v] = w
+                    heapq.heappush(heaps[side], (nd, pushes, v))
+                    pushes += 1
+                    if v in otherdist and (best is None or nd + otherdist[v] < best):
+                        best = nd + otherdist[v]
+                        meet = v
+
+        if observer is not None:
+            observer('bidijkstra', {'settled': len(settled[0]) + len(settled[1]),
+                                    'relaxed': _degreesum(adj[0], settled[0]) + _degreesum(adj[1], settled[1]),
+                                    'pushes': pushes + 1},
+                     time.time() - start)
+        if best is None:
+            return None, []
+
+        path = getpath(pred[0], meet)
+        n = meet
+        while n in pred[1]:
+            n = pred[1][n]
+            path.append(n)
+        return best, path
+
+    def astar(self, a, b, heuristic):
+        '''
+        A* search for a cheapest path from a to b, returning (cost, path) like shortestpath.  heuristic(n, b) gives
+        an estimate of the cost from n to b; it must never overestimate, or the path found may not be the cheapest.
+        '''
+        for n in (a, b):
+            if n not in self.adj_list:
+                raise GraphException("node %s not in graph" % n)
+
+        observer = _observer
+        if observer is not None:
+            start = time.time()
+
+        adj_list = self.adj_list
+        gscore = {a: 0}
+        pred = {}
+        # heap entries are (estimated total, sequence, cost so far, node)
+        heap = [(heuristic(a, b), 0, 0, a)]
+        pushes = 1
+        result = None, []
+        while heap:
+            _, _, d, w = heapq.heappop(heap)
+            if d > gscore[w]:
+                # stale entry; w has been reached more cheaply since
+                continue
+            if w == b:
+                result = d, getpath(pred, b)
+                break
+
+            for v, cost in adj_list[w]:
+                nd = d + cost
+                if v not in gscore or nd < gscore[v]:
+                    gscore[v] = nd
+                    pred[v] = w
+                    heapq.heappush(heap, (nd + heuristic(v, b), pushes, nd, v))
+                    pushes += 1
+
+        if observer is not None:
+            # a node can be expanded more than once here, so there's no settled count; pops includes stale entries
+            observer('astar', {'reached': len(gscore), 'pushes': pushes, 'pops': pushes - len(heap)},
+                     time.time() - start)
+        return result
+
+    def _reverseadjacency(self):
+        # returns a dict mapping each node to a list of (predecessor, cost) pairs.  callers must not modify it.
+        if self._reverse is None:
+            reverse = dict((n, []) for n in self.nodes())
+            for n in self.nodes():
+                for terminus, cost in self.adj_list[n]:
+                    reverse[terminus].append((n, cost))
+            self._reverse = reverse
+        return self._reverse
 
 
 class UGraph(DGraph):
@@ -189,14 +940,49 @@ class UGraph(DGraph):
     implements an undirected graph.
     '''
 
-    def __init__(self):
-        super(UGraph, self).__init__()
+    def __init__(self, multiedges='allow'):
+        super(UGraph, self).__init__(multiedges)
 
     def addedge(self, a, b, cost=1):
         super(UGraph, self).addedge(a, b, cost)
-        super(UGraph, self).addedge(b, a, cost)
+        if a != b or self._multiedges == 'allow':
+            super(UGraph, self).addedge(b, a, cost)
 
-    def edges(self):
+    @staticmethod
+    def _edgekey(a, b):
+        return frozenset((a, b))
+
+    @staticmethod
+    def _expandarcs(arcs):
+        return arcs + [(b, a, cost) for a, b, cost in arcs]
+
+    def _reverseadjacency(self):
+        # every edge goes both ways, so adj_list is its own reverse
+        return self.adj_list
+
+    def trackpredecessors(self):
+        # nothing to do; see _reverseadjacency
+        pass
+
+    def reversed(self):
+        return subgraph(self)
+
+    def removeedge(self, a, b, cost=None):
+        self._removearcs(a, b, cost)
+        if a != b:
+            self._removearcs(b, a, cost)
+        self._arcsremoved([a, b])
+
+    def updatecost(self, a, b, cost):
+        self._setcost(a, b, cost)
+        if a != b:
+            self._setcost(b, a, cost)
+        self._version += 1
+
+    def _inneighbors(self, n):
+        return set(arc[0] for arc in self.adj_list[n])
+
+    def arcs(self):
         # since this is an undirected graph, we have to be careful about not putting back-and-forth edges into the
         # result set.  we'll put edges in where the origin is lexicographically less than the terminus
 
@@ -205,189 +991,1602 @@ class UGraph(DGraph):
                 a1 = n
                 a2 = arc[0]
                 if a1 < a2:
-                    yield Edge(a1, a2, arc[1])
+                    yield a1, a2, arc[1]
+
+    def compact(self):
+        return CompactUGraph.fromgraph(self)
+
+
+class CSRAdjacency(collections.Mapping):
+    '''
+    read-only stand-in for DGraph.adj_list, backed by compressed-sparse-row arrays.
+    '''
+    # node i has integer id i; its arcs are targets[offsets[i]:offsets[i + 1]] with the matching entries of costs.
+    # looking a node up yields the same [(Node, cost), ...] list that a regular adj_list would hold.
+
+    def __init__(self, labels, offsets, targets, costs):
+        if len(offsets) != len(labels) + 1:
+            raise GraphException("need %d offsets, got %d" % (len(labels) + 1, len(offsets)))
+        if len(targets) != len(costs):
+            raise GraphException("%d targets but %d costs" % (len(targets), len(costs)))
+
+        self.labels = labels
+        self.index = dict((n, i) for i, n in enumerate(labels))
+        self.offsets = offsets
+        self.targets = targets
+        self.costs = costs
+
+    def __getitem__(self, n):
+        i = self.index[n]
+        lo = self.offsets[i]
+        hi = self.offsets[i + 1]
+        labels = self.labels
+        return [(labels[t], c) for t, c in zip(self.targets[lo:hi], self.costs[lo:hi])]
+
+    def __contains__(self, n):
+        return n in self.index
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __repr__(self):
+        return 'CSRAdjacency(%d nodes, %d arcs)' % (len(self.labels), len(self.targets))
+
+
+class MappedArray(object):
+    '''
+    read-only array of fixed-size numbers stored in a memory-mapped file.
+    '''
+
+    def __init__(self, buf, start, count, fmt):
+        # fmt is a single struct code, e.g. 'q' or 'd'.  values are little-endian.
+        self._buf = buf
+        self._start = start
+        self._count = count
+        self._fmt = fmt
+        self._itemsize = struct.calcsize('<' + fmt)
+        # the array module typecode with the same meaning
+        self.typecode = 'd' if fmt == 'd' else 'l'
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            lo, hi, step = i.indices(self._count)
+            if step != 1:
+                raise GraphException("MappedArray only supports contiguous slices")
+            n = max(0, hi - lo)
+            return list(struct.unpack_from('<%d%s' % (n, self._fmt), self._buf, self._start + lo * self._itemsize))
+
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("MappedArray index out of range")
+        return struct.unpack_from('<' + self._fmt, self._buf, self._start + i * self._itemsize)[0]
+
+    def __iter__(self):
+        # in chunks, so that big arrays aren't unpacked all at once
+        for lo in range(0, self._count, 65536):
+            for x in self[lo:lo + 65536]:
+                yield x
+
+
+class _ReadOnlyGraph(object):
+    # mixin for graphs whose adj_list is a read-only mapping rather than a dict.  everything that reads adj_list
+    # works unchanged; everything that would modify it raises.
+
+    def addnode(self, n):
+        raise GraphException("graph is read-only")
+
+    def addedge(self, a, b, cost=1):
+        raise GraphException("graph is read-only")
+
+    def addedges(self, edges):
+        raise GraphException("graph is read-only")
+
+    def removeedge(self, a, b, cost=None):
+        raise GraphException("graph is read-only")
+
+    def removenode(self, n):
+        raise GraphException("graph is read-only")
+
+    def updatecost(self, a, b, cost):
+        raise GraphException("graph is read-only")
+
+    def trackcomponents(self):
+        raise GraphException("graph is read-only")
+
+    def trackpredecessors(self):
+        # nothing can change the graph through here, so the index built on demand is as good as a tracked one
+        self._reverseadjacency()
+
+
+class _CompactGraph(_ReadOnlyGraph):
+    # mixin for the frozen CSR-backed graphs.
+
+    def __init__(self, labels, offsets, targets, costs):
+        super(_CompactGraph, self).__init__()
+        self.adj_list = CSRAdjacency(labels, offsets, targets, costs)
+
+    @classmethod
+    def fromgraph(cls, g):
+        labels = list(g.nodes())
+        return cls.fromarcs(labels, [(n, arc[0], arc[1]) for n in labels for arc in g.adj_list[n]])
+
+    @classmethod
+    def fromedges(cls, edges, nodes=(), multiedges='allow'):
+        # builds the CSR arrays directly, without going through a dict-based graph first.  multiedges works as for
+        # DGraph.fromedges.
+        if multiedges not in cls.MULTIEDGE_POLICIES:
+            raise GraphException("unknown multi-edge policy %s" % multiedges)
+        edges = _checkedges(edges)
+        if multiedges == 'allow':
+            arcs = cls._expandarcs(edges)
+        else:
+            arcs = cls._mergearcs(edges, multiedges)
+        g = cls.fromarcs([_asnode(n) for n in nodes], arcs)
+        g._multiedges = multiedges
+        return g
+
+    @classmethod
+    @_pausegc
+    def fromarcs(cls, nodes, arcs):
+        # nodes, then any endpoints of arcs not among them, get ids in order of appearance.  arcs are
+        # (origin, terminus, cost) tuples; they are bucketed by origin with a counting sort, which keeps each
+        # node's arcs in the order given.
+        index = {}
+        labels = []
+        for n in nodes:
+            if n in index:
+                raise GraphException("node %s is already in the graph" % n)
+            index[n] = len(labels)
+            labels.append(n)
+
+        indexed = []
+        for a, b, cost in arcs:
+            for n in (a, b):
+                if n not in index:
+                    index[n] = len(labels)
+                    labels.append(n)
+            indexed.append((index[a], index[b], cost))
+        return cls._buildcsr(labels, indexed)
+
+    @classmethod
+    def _fromindexed(cls, labels, arcs):
+        # as for DGraph._fromindexed
+        return cls._buildcsr([Node(x) for x in labels], cls._expandarcs(arcs))
+
+    @classmethod
+    @_pausegc
+    def _buildcsr(cls, nodes, arcs):
+        # nodes are the distinct Nodes of the graph, and arcs are (origin, terminus, cost) with the ends given as
+        # indexes into nodes
+        origins = array('l', [a[0] for a in arcs])
+        termini = array('l', [a[1] for a in arcs])
+        arccosts = [a[2] for a in arcs]
+
+        offsets = array('l', [0]) * (len(nodes) + 1)
+        for i in origins:
+            offsets[i + 1] += 1
+        for i in range(len(nodes)):
+            offsets[i + 1] += offsets[i]
+
+        nextslot = offsets[:-1]
+        targets = array('l', [0]) * len(termini)
+        sortedcosts = [None] * len(termini)
+        for k, i in enumerate(origins):
+            slot = nextslot[i]
+            targets[slot] = termini[k]
+            sortedcosts[slot] = arccosts[k]
+            nextslot[i] = slot + 1
+
+        # integer costs are stored exactly; anything else is stored as double
+        if all(isinstance(c, (int, long)) for c in sortedcosts):
+            costs = array('l', sortedcosts)
+        else:
+            costs = array('d', sortedcosts)
+        return cls(nodes, offsets, targets, costs)
+
+    def compact(self):
+        return self
+
+
+class CompactDGraph(_CompactGraph, DGraph):
+    '''
+    frozen directed graph with compressed-sparse-row storage.  build one with DGraph.compact().
+    '''
+    pass
+
+
+class CompactUGraph(_CompactGraph, UGraph):
+    '''
+    frozen undirected graph with compressed-sparse-row storage.  build one with UGraph.compact().
+    '''
+    pass
+
+
+class InducedAdjacency(collections.Mapping):
+    '''
+    read-only stand-in for adj_list that only shows the given nodes (all of them, if nodes is None), and only the
+    arcs between them that cost at most maxcost and for which keep(origin, terminus, cost) is true.
+    '''
+
+    def __init__(self, adj_list, nodes=None, maxcost=None, keep=None):
+        self.parent = adj_list
+        self.nodes = nodes
+        self.maxcost = maxcost
+        self.keep = keep
+
+    def __getitem__(self, n):
+        nodes = self.nodes
+        if nodes is None:
+            arcs = self.parent[n]
+        elif n not in nodes:
+            raise KeyError(n)
+        else:
+            arcs = [arc for arc in self.parent[n] if arc[0] in nodes]
+
+        if self.maxcost is not None:
+            maxcost = self.maxcost
+            arcs = [arc for arc in arcs if arc[1] <= maxcost]
+        if self.keep is not None:
+            keep = self.keep
+            arcs = [arc for arc in arcs if keep(n, arc[0], arc[1])]
+        return arcs
+
+    def __contains__(self, n):
+        return n in (self.parent if self.nodes is None else self.nodes)
+
+    def __iter__(self):
+        return iter(self.parent if self.nodes is None else self.nodes)
+
+    def __len__(self):
+        return len(self.parent if self.nodes is None else self.nodes)
+
+
+class _GraphView(_ReadOnlyGraph):
+    # mixin for the read-only views over another graph.  nothing is copied:  adjacency lists are filtered as they
+    # are looked at, so later changes to the parent show through.
+
+    def __init__(self, g, nodes=None, maxcost=None, keep=None):
+        super(_GraphView, self).__init__()
+        if nodes is not None:
+            nodes = frozenset(nodes)
+            for n in nodes:
+                if not g.contains(n):
+                    raise GraphException("node %s not in graph" % n)
+        self.parent = g
+        self.adj_list = InducedAdjacency(g.adj_list, nodes, maxcost, keep)
+        # parent version that _reverse was built for
+        self._reverseversion = None
+
+    @property
+    def version(self):
+        return self.parent.version
+
+    def _sortedneighbors(self, n):
+        # no caching here, since the parent can change underneath us
+        self._sorts += 1
+        return sorted([x[0] for x in self.adj_list[n]], key=lambda k: k._label)
+
+    def _arcmap(self, a):
+        # likewise
+        return self._indexarcs(self.adj_list[a])
+
+    def _reverseadjacency(self):
+        # the reverse index is only good for as long as the parent doesn't change
+        if self._reverseversion != self.version:
+            self._reverse = None
+            self._reverseversion = self.version
+        return super(_GraphView, self)._reverseadjacency()
+
+    def materialize(self):
+        # copy the view into a new, ordinary graph of the same kind as the parent.  compact() makes a frozen CSR
+        # copy instead, which is quicker to build and much smaller.
+        g = UGraph() if isinstance(self, UGraph) else DGraph()
+        for n in self.nodes():
+            g.addnode(n)
+        for n in self.nodes():
+            g.adj_list[n] = list(self.adj_list[n])
+        return g
+
+
+class DSubgraphView(_GraphView, DGraph):
+    '''
+    read-only view of part of the directed graph g:  the subgraph induced by nodes (all of g's nodes if None),
+    keeping only the edges that cost at most maxcost and for which keep(origin, terminus, cost) is true.
+    '''
+    pass
+
+
+class SubgraphView(_GraphView, UGraph):
+    '''
+    undirected counterpart of DSubgraphView.  keep should give the same answer for both directions of an edge.
+    '''
+    pass
+
+
+class ReverseAdjacency(collections.Mapping):
+    '''
+    read-only stand-in for adj_list that maps each node of g to its in-arcs, as (predecessor, cost) pairs.
+    '''
+
+    def __init__(self, g):
+        self.graph = g
+
+    def __getitem__(self, n):
+        return self.graph._reverseadjacency()[n]
+
+    def __contains__(self, n):
+        return n in self.graph.adj_list
+
+    def __iter__(self):
+        return iter(self.graph.adj_list)
+
+    def __len__(self):
+        return len(self.graph.adj_list)
+
+
+class ReverseView(_GraphView, DGraph):
+    '''
+    read-only view of the directed graph g with its edges reversed.  see DGraph.reversed.
+    '''
+
+    def __init__(self, g):
+        super(ReverseView, self).__init__(g)
+        self.adj_list = ReverseAdjacency(g)
+
+    def _reverseadjacency(self):
+        return self.parent.adj_list
+
+
+def subgraph(g, nodes=None, maxcost=None, keep=None):
+    '''
+    return a read-only, zero-copy view of part of g, directed or undirected to match g.  see DSubgraphView.
+    '''
+    cls = SubgraphView if isinstance(g, UGraph) else DSubgraphView
+    return cls(g, nodes, maxcost, keep)
+
+
+def componentview(g, n):
+    '''
+    view of the connected component of g containing n.  on a directed graph, this is everything reachable from n.
+    '''
+    return subgraph(g, bfslevels(g, [n]))
+
+
+class PathCache(object):
+    '''
+    bounded LRU cache of the shortest-path trees of a graph, i.e. the (dist, pred) pairs that its dijkstra method
+    returns, keyed by source.  everything cached is dropped as soon as the graph's version changes.
+    '''
+
+    def __init__(self, g, maxsize=128):
+        if maxsize < 1:
+            raise GraphException("cache size must be at least 1")
+        self.graph = g
+        self.maxsize = maxsize
+        self._trees = collections.OrderedDict()
+        self._version = g.version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._trees)
+
+    def dijkstra(self, n):
+        # same as self.graph.dijkstra(n), from the cache if possible.  the dicts returned are shared with the
+        # cache, so don't modify them.
+        if self.graph.version != self._version:
+            self.invalidations += len(self._trees)
+            self._trees.clear()
+            self._version = self.graph.version
+
+        tree = self._trees.pop(n, None)
+        if tree is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            tree = self.graph.dijkstra(n)
+            if len(self._trees) >= self.maxsize:
+                self._trees.popitem(last=False)
+                self.evictions += 1
+        # most recently used goes at the end
+        self._trees[n] = tree
+        return tree
+
+    def shortestpath(self, a, b):
+        # same as self.graph.shortestpath(a, b), but reads the path off the cached tree for a
+        if not self.graph.contains(b):
+            raise GraphException("node %s not in graph" % b)
+
+        dist, pred = self.dijkstra(a)
+        if b not in dist:
+            return None, []
+        return dist[b], getpath(pred, b)
+
+    def clear(self):
+        self._trees.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'size': len(self._trees),
+            'maxsize': self.maxsize,
+        }
+
+
+class ReachabilityIndex(object):
+    '''
+    answers "is there a path from a to b" for a directed graph in constant time.  built once from the condensation
+    of the graph, and rebuilt on the next query after the graph changes.
+    '''
+    # each strongly connected component gets a bitset of the components it can reach, computed by OR-ing
+    # together the bitsets of its successors in reverse topological order.  that takes O(k^2 / 8) bytes for k
+    # components, which is what makes it a good fit for graphs that condense well.
+
+    def __init__(self, g):
+        self.graph = g
+        self._build()
+
+    def _build(self):
+        c, membership = condensation(self.graph)
+        self._component = dict((n, cn.label) for n, cn in membership.items())
+
+        k = len(c)
+        successors = [None] * k
+        for cn in c.nodes():
+            successors[cn.label] = [arc[0].label for arc in c.adj_list[cn]]
+
+        # components are labelled in topological order, so everything a component reaches has a higher label
+        bits = [0] * k
+        for i in reversed(range(k)):
+            reach = 1 << i
+            for j in successors[i]:
+                reach |= bits[j]
+            bits[i] = reach
+
+        # as bytes, bit j of component i is bit j % 8 of byte j / 8 counting from the end, and can be looked up
+        # without shifting a k-bit number around
+        self._reach = []
+        for reach in bits:
+            digits = '%x' % reach
+            self._reach.append(bytearray(binascii.unhexlify('0' * (len(digits) % 2) + digits)))
+        self._version = self.graph.version
+
+    def reachable(self, a, b):
+        if self.graph.version != self._version:
+            self._build()
+
+        for n in (a, b):
+            if n not in self._component:
+                raise GraphException("node %s not in graph" % n)
+        i = self._component[a]
+        j = self._component[b]
+        if i == j:
+            return True
+        if i > j:
+            return False
+        reach = self._reach[i]
+        byte = len(reach) - 1 - (j >> 3)
+        return byte >= 0 and bool(reach[byte] >> (j & 7) & 1)
+
+
+class DisjointSet(object):
+    '''
+    union-find over arbitrary hashable items, with union by rank and path compression.
+    '''
+
+    def __init__(self, items=()):
+        self._parent = {}
+        self._rank = {}
+        # number of disjoint sets
+        self.count = 0
+        for x in items:
+            self.add(x)
+
+    def __len__(self):
+        # returns the number of items, not the number of sets
+        return len(self._parent)
+
+    def __contains__(self, x):
+        return x in self._parent
+
+    def add(self, x):
+        # put x in a set by itself.  adding an item twice is a no-op.
+        if x not in self._parent:
+            self._parent[x] = x
+            self._rank[x] = 0
+            self.count += 1
+
+    def find(self, x):
+        # return the representative of the set containing x
+        parent = self._parent
+        if x not in parent:
+            raise GraphException("%s not in disjoint set" % x)
+
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+
+        # point everything on the way up straight at the root
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        # merge the sets containing a and b.  returns False if they were already in the same set.
+        ra = self.find(a)
+        rb = self.find(b)
+        if ra == rb:
+            return False
+
+        rank = self._rank
+        if rank[ra] < rank[rb]:
+            ra, rb = rb, ra
+        self._parent[rb] = ra
+        if rank[ra] == rank[rb]:
+            rank[ra] += 1
+        self.count -= 1
+        return True
+
+    def connected(self, a, b):
+        return self.find(a) == self.find(b)
+
+    def clear(self):
+        self._parent.clear()
+        self._rank.clear()
+        self.count = 0
+
+    def sets(self):
+        # return the disjoint sets, as a list of lists
+        groups = {}
+        for x in self._parent:
+            groups.setdefault(self.find(x), []).append(x)
+        return list(groups.values())
 
 ##########    ##########    ##########    ##########    ##########
 
 
-def _next_unvisited_neighbor(g, n, visited):
-    adj_list = sorted([x[0] for x in g.adj_list[n]], key=lambda n: n._label)
-    for k in adj_list:
+def _asnode(x):
+    # bulk loaders see each label many times; interning keeps them from making a new Node every time
+    return x if isinstance(x, Node) else Node.intern(x)
+
+
+def _checkedges(edges):
+    # validate a batch of edges for the bulk loaders, returning them as a list of (Node, Node, cost) tuples.
+    result = []
+    # label -> Node for this batch, which is a lot cheaper to look in than Node.intern's weak dictionary
+    seen = {}
+    for i, e in enumerate(edges):
+        if len(e) == 3:
+            a, b, cost = e
+        elif len(e) == 2:
+            a, b = e
+            cost = 1
+        else:
+            raise GraphException("edge %d is %r, expected (origin, terminus) or (origin, terminus, cost)" % (i, e))
+
+        if not isinstance(a, Node):
+            a = seen[a] if a in seen else seen.setdefault(a, Node.intern(a))
+        if not isinstance(b, Node):
+            b = seen[b] if b in seen else seen.setdefault(b, Node.intern(b))
+        result.append((a, b, cost))
+    return result
+
+
+def _degreesum(adj_list, nodes):
+    # the number of arcs leaving nodes, which is how many a search that expanded each of them has looked at
+    return sum(len(adj_list[n]) for n in nodes)
+
+
+def getpath(pred, n):
+    # walk a predecessor map (as returned by dijkstra) back from n to the source.  returns the path in order,
+    # starting with the source and ending with n.
+    path = [n]
+    while n in pred:
+        n = pred[n]
+        path.append(n)
+    path.reverse()
+    return path
+
+
+def _next_unvisited_neighbor(cursor, visited):
+    # cursor is an iterator over a node's sorted neighbors.  advance it past the visited ones and return the next
+    # unvisited neighbor, or None if there isn't one.  since the cursor lives on the stack next to its node, each
+    # adjacency list is scanned once per traversal.
+    for k in cursor:
         if k not in visited:
             return k
 
 
 def dfs(g, n):
-    # non-recursive implementation
+    return ''.join(str(k) for k in iterdfs(g, n))
+
+
+def bfs(g, n):
+    return ''.join(str(k) for k in iterbfs(g, n))
+
+
+def bfs_zigzag(g, n):
+    return ''.join(str(k) for k in iterbfs_zigzag(g, n))
+
+
+def iterdfs(g, n, details=False):
+    '''
+    depth-first traversal from n, yielding each node as it is first visited.  if details is true, yield
+    (node, depth, parent) tuples instead, where parent is None for n itself.
+    '''
+    if not g.contains(n):
+        raise GraphException("node %s not in graph" % n)
+    observer = _observer
+    if observer is not None:
+        return _observed(observer, 'dfs', g, _iterdfs(g, n, details), details)
+    return _iterdfs(g, n, details)
+
+
+def iterbfs(g, n, details=False):
+    '''
+    breadth-first traversal from n, yielding each node as it comes off the queue.  details works as for iterdfs.
+    '''
+    if not g.contains(n):
+        raise GraphException("node %s not in graph" % n)
+    observer = _observer
+    if observer is not None:
+        return _observed(observer, 'bfs', g, _iterbfs(g, n, details, False), details)
+    return _iterbfs(g, n, details, False)
+
 
+def iterbfs_zigzag(g, n, details=False):
+    '''
+    breadth-first traversal from n, yielding each node as soon as it is put on the queue.  details works as for
+    iterdfs.
+    '''
     if not g.contains(n):
         raise GraphException("node %s not in graph" % n)
-    
+    observer = _observer
+    if observer is not None:
+        return _observed(observer, 'bfs_zigzag', g, _iterbfs(g, n, details, True), details)
+    return _iterbfs(g, n, details, True)
+
+
+def _observed(observer, name, g, items, details):
+    # pass a traversal's output through, reporting it to observer once it is used up or abandoned.  observer is
+    # the one installed when the traversal was asked for, and the clock starts then too, so a traversal that's
+    # created inside instrumented() and used up after it still reports to the right place.
+    start = time.time()
+    sorts = g._sorts
+    adj_list = g.adj_list
+
+    def walk():
+        settled = relaxed = 0
+        try:
+            for item in items:
+                settled += 1
+                relaxed += len(adj_list[item[0] if details else item])
+                yield item
+        finally:
+            observer(name, {'settled': settled, 'relaxed': relaxed, 'sorts': g._sorts - sorts}, time.time() - start)
+
+    return walk()
+
+
+def _iterdfs(g, n, details):
+    # non-recursive implementation
+
     stack = []
     visited = set()
-    
-    stack.append(n)
+
+    stack.append((n, iter(g._sortedneighbors(n))))
     visited.add(n)
-    result = str(n)
-    
+    yield (n, 0, None) if details else n
+
     # look at node on top of stack
     # if it has an unvisited neighbor,
     # mark it visited and put it at top of stack
     # otherwise pull it off
-    
+
     while len(stack) > 0:
-        top = stack[-1]
+        top, cursor = stack[-1]
         # get next unvisited neighbor
-        k = _next_unvisited_neighbor(g, top, visited)
+        k = _next_unvisited_neighbor(cursor, visited)
         if k is None:
             stack.pop()
         else:
-            stack.append(k)
+            stack.append((k, iter(g._sortedneighbors(k))))
             visited.add(k)
-            result += str(k)
+            yield (k, len(stack) - 1, top) if details else k
 
-    return result
 
+def _iterbfs(g, n, details, ondiscovery):
+    # non-recursive implementation.  if ondiscovery is true, nodes are reported when they are enqueued rather than
+    # when they are dequeued.  the order is the same either way, but the consumer sees each node one step sooner.
 
-def bfs(g, n):
-    # non-recursive implementation
-
-    if not g.contains(n):
-        raise GraphException("node %s not in graph" % n)
-    
     q = collections.deque()
     visited = set()
 
     # look at front of queue
-    # put all unvisited adj_list on queue, mark visited
+    # put all unvisited neighbors on queue, mark visited
     # dequeue
 
-    q.append(n)
+    q.append((n, 0, None))
     visited.add(n)
-    result = ""
+    if ondiscovery:
+        yield q[0] if details else n
 
     while len(q) > 0:
 
-        front = q.popleft()
-        result += str(front)
-        
-        # enqueue all unvisited adj_list
-        adj_list = g.neighbors(front)
-        for k in adj_list:
+        item = q.popleft()
+        front, depth = item[0], item[1]
+        if not ondiscovery:
+            yield item if details else front
+
+        # enqueue all unvisited neighbors
+        for k in g._sortedneighbors(front):
             if k not in visited:
-                q.append(k)
+                item = (k, depth + 1, front)
+                q.append(item)
                 visited.add(k)
-                
-    return result
+                if ondiscovery:
+                    yield item if details else k
 
-            
-def bfs_zigzag(g, n):
-    # non-recursive implementation
 
-    if not g.contains(n):
-        raise GraphException("node %s not in graph" % n)
-    
-    q = collections.deque()
-    visited = set()
-
-    q.append(n)
-    visited.add(n)
-    result = str(n)
+def componentlabels(g):
+    '''
+    label the connected components of g in one pass.  returns (labels, sizes):  labels maps each node to a
+    component id, sizes[i] is the number of nodes in component i.
+    '''
+    # like getpartitions, this is for undirected graphs.  on a directed graph, it follows out-edges only.
 
-    while len(q) > 0:
+    labels = {}
+    sizes = []
+    adj_list = g.adj_list
+    for n in g.nodes():
+        if n in labels:
+            continue
 
-        front = q.popleft()
-        
-        # enqueue all unvisited adj_list
-        adj_list = g.neighbors(front)
-        for k in adj_list:
-            if k not in visited:
-                q.append(k)
-                visited.add(k)
-                result += str(k)
+        cid = len(sizes)
+        labels[n] = cid
+        size = 0
+        stack = [n]
+        while stack:
+            v = stack.pop()
+            size += 1
+            for arc in adj_list[v]:
+                if arc[0] not in labels:
+                    labels[arc[0]] = cid
+                    stack.append(arc[0])
+        sizes.append(size)
 
-    return result
+    return labels, sizes
 
 
-def getpartitions(g):
+def getpartitions(g, views=False):
     # for the given graph, return its disjoint subgraphs.  if the graph isn't partitioned, just return the the
-    # graph.  if it is, return one node from each subgraph.
+    # graph.  if it is, return one node from each subgraph.  with views=True, the subgraphs are views of g's
+    # kind (see subgraph) instead of copies.
     #
     # todo - this will only work for undirected graphs.  if the graph is directed, we can't traverse the subgraphs
     # todo - whose member nodes we are returning.
 
-    result = []
+    observer = _observer
+    if observer is not None:
+        start = time.time()
 
-    # idea:  pick a node and do DFS on the graph.  if there are any nodes we still haven't visited, do it again.
-    unvisited = set([n for n in g.nodes()])
-    while len(unvisited) > 0:
-        stack = []
-        visited = set()
-
-        n = unvisited.pop()
-        stack.append(n)
-        visited.add(n)
-
-        # look at node on top of stack
-        # if it has an unvisited neighbor,
-        # mark it visited and put it at top of stack
-        # otherwise pull it off
-
-        while len(stack) > 0:
-            top = stack[-1]
-            # get next unvisited neighbor
-            k = _next_unvisited_neighbor(g, top, visited)
-            if k is None:
-                stack.pop()
-            else:
-                stack.append(k)
-                visited.add(k)
-                unvisited.remove(k)
+    labels, sizes = componentlabels(g)
+    members = [[] for _ in sizes]
+    for n, cid in labels.items():
+        members[cid].append(n)
+
+    if observer is not None:
+        observer('getpartitions', {'settled': len(labels), 'relaxed': _degreesum(g.adj_list, labels),
+                                   'components': len(sizes)},
+                 time.time() - start)
 
-        # visited now has all the nodes in the subgraph.  make a new graph out of them.
-        subgraph = UGraph()
-        for n in visited:
-            subgraph.addnode(n)
-            subgraph.adj_list[n] = list(g.adj_list[n])
-        result.append(subgraph)
+    if views:
+        return [subgraph(g, m) for m in members]
+
+    result = []
+    for m in members:
+        # make a new graph out of the nodes in this component.
+        component = UGraph()
+        for n in m:
+            component.addnode(n)
+            component.adj_list[n] = list(g.adj_list[n])
+        result.append(component)
 
     return result
 
 
 def kruskal(g):
-    # return a MST for this graph using kruskal's algorithm.
+    # return a MST for this graph using kruskal's algorithm.  if the graph isn't connected, this is a minimum
+    # spanning forest.
+
+    observer = _observer
+    if observer is not None:
+        start = time.time()
+
+    allnodes = list(g.nodes())
+    components = DisjointSet(allnodes)
+
+    mstedges = []
+    edges = sorted(g.arcs(), key=operator.itemgetter(2))
+    i = -1
+    for i, ex in enumerate(edges):
+        # if the nodes of this edge are already in the same set, skip it, because we'd introduce a cycle.
+        if not components.union(ex[0], ex[1]):
+            continue
 
-    # make a dict mapping each node to a set containing that node.
-    lookup = {}
-    for n in g.nodes():
-        lookup[n] = set([n])
+        mstedges.append(ex)
+        if components.count == 1:
+            break
+
+    returnme = UGraph()
+    for n in allnodes:
+        returnme.addnode(n)
 
-    mstedges = set()
-    allnodes = set([n for n in g.nodes()])
-    edges = sorted([e for e in g.edges()], key=lambda x: x.cost)
-    for ex in edges:
-        sorigin = lookup[ex.origin]
-        sterminus = lookup[ex.terminus]
+    for origin, terminus, cost in mstedges:
+        returnme.addedge(origin, terminus, cost)
 
-        # if the nodes of this edge are already in some set, skip it, because we'd introduce a cycle.
-        if ex.origin in sorigin and ex.terminus in sorigin:
+    if observer is not None:
+        # every edge looked at costs one union attempt, and the loop may have stopped early.  the ones that merged
+        # two sets are the tree edges.
+        observer('kruskal', {'sorts': 1, 'edges': len(edges), 'unions': i + 1, 'merges': len(mstedges)},
+                 time.time() - start)
+    return returnme
+
+
+def bfslevels(g, sources):
+    '''
+    hop distances from a set of sources:  returns a dict mapping every node reachable from any of them to the
+    number of edges on the shortest path from the nearest one.
+    '''
+    return next(multibfs(g, [sources], processes=1))
+
+
+def multibfs(g, seedsets, processes=None, batchsize=64):
+    '''
+    bfslevels for many seed sets.  yields one dict per seed set, in order.  batchsize seed sets at a time are
+    searched together in a single pass over the graph, each node carrying a bitset of the seed sets that have
+    reached it so far.  batches are spread over processes worker processes, as in allpairs.
+    '''
+    seedsets = [list(seeds) for seeds in seedsets]
+    for seeds in seedsets:
+        for n in seeds:
+            if not g.contains(n):
+                raise GraphException("node %s not in graph" % n)
+    if batchsize < 1:
+        raise GraphException("batch size must be at least 1")
+
+    batches = [seedsets[lo:lo + batchsize] for lo in range(0, len(seedsets), batchsize)]
+    return itertools.chain.from_iterable(_poolmap(g, _bitsetbfs, batches, processes))
+
+
+def _bitsetbfs(g, seedsets):
+    # multi-source bfs in the style of then et al.:  bit i of a node's mask is set once seed set i has reached it,
+    # and a whole level is expanded for every seed set at once by pushing masks along the edges.
+    adj_list = g.adj_list
+    levels = [{} for _ in seedsets]
+    seen = {}
+    frontier = {}
+    for i, seeds in enumerate(seedsets):
+        bit = 1 << i
+        for n in seeds:
+            seen[n] = frontier[n] = seen.get(n, 0) | bit
+            levels[i][n] = 0
+
+    depth = 0
+    while frontier:
+        depth += 1
+        reached = {}
+        for v, bits in frontier.iteritems():
+            for arc in adj_list[v]:
+                w = arc[0]
+                new = bits & ~seen.get(w, 0)
+                if new:
+                    seen[w] = seen.get(w, 0) | new
+                    reached[w] = reached.get(w, 0) | new
+
+        for w, bits in reached.iteritems():
+            while bits:
+                low = bits & -bits
+                levels[low.bit_length() - 1][w] = depth
+                bits ^= low
+        frontier = reached
+
+    return levels
+
+
+def toposort(g):
+    '''
+    return the nodes of the directed graph g as a list in topological order (kahn's algorithm).  raises
+    CycleException if g has a cycle.
+    '''
+    adj_list = g.adj_list
+    indegree = dict((n, 0) for n in g.nodes())
+    for n in g.nodes():
+        for arc in adj_list[n]:
+            indegree[arc[0]] += 1
+
+    ready = collections.deque(n for n in g.nodes() if indegree[n] == 0)
+    order = []
+    while ready:
+        n = ready.popleft()
+        order.append(n)
+        for arc in adj_list[n]:
+            indegree[arc[0]] -= 1
+            if indegree[arc[0]] == 0:
+                ready.append(arc[0])
+
+    if len(order) < len(indegree):
+        cycle = _findcycle(g, set(n for n, k in indegree.items() if k > 0))
+        raise CycleException("graph has a cycle: %s" % ' -> '.join(str(n) for n in cycle), cycle)
+    return order
+
+
+def _findcycle(g, candidates):
+    # every node left over by kahn's algorithm still has a predecessor among the leftovers, so walking backwards
+    # from any of them has to come around to a node it has already seen.
+    reverse = g._reverseadjacency()
+    n = next(iter(candidates))
+    seen = {}
+    walk = []
+    while n not in seen:
+        seen[n] = len(walk)
+        walk.append(n)
+        n = next(p for p, cost in reverse[n] if p in candidates)
+    cycle = walk[seen[n]:] + [n]
+    cycle.reverse()
+    return cycle
+
+
+def dagpaths(g, n, longest=False):
+    '''
+    single-source shortest (or, with longest=True, longest) paths in a DAG, in one pass over the nodes in
+    topological order.  returns (dist, pred) like dijkstra.  costs may be negative.
+    '''
+    if not g.contains(n):
+        raise GraphException("node %s not in graph" % n)
+
+    adj_list = g.adj_list
+    better = operator.gt if longest else operator.lt
+    dist = {n: 0}
+    pred = {}
+    for v in toposort(g):
+        if v not in dist:
             continue
+        d = dist[v]
+        for w, cost in adj_list[v]:
+            if w not in dist or better(d + cost, dist[w]):
+                dist[w] = d + cost
+                pred[w] = v
+    return dist, pred
+
+
+def criticalpath(g):
+    '''
+    the longest path anywhere in the DAG g, e.g. the chain of tasks that decides how long a schedule takes when
+    edge costs are durations.  returns (length, path); a graph without edges has a critical path of length 0
+    through a single node.
+    '''
+    order = toposort(g)
+    if not order:
+        raise GraphException("graph is empty")
+
+    adj_list = g.adj_list
+    # every node starts a path of length 0, so dist covers all of them
+    dist = dict((n, 0) for n in order)
+    pred = {}
+    for v in order:
+        d = dist[v]
+        for w, cost in adj_list[v]:
+            if d + cost > dist[w]:
+                dist[w] = d + cost
+                pred[w] = v
+
+    end = max(order, key=lambda n: dist[n])
+    return dist[end], getpath(pred, end)
+
+
+def scc(g):
+    '''
+    strongly connected components of the directed graph g, by tarjan's algorithm.  returns a list of lists of
+    nodes.  a component comes before every component that can reach it, i.e. the list is in reverse topological
+    order of the condensation.
+    '''
+    # the recursion is unrolled into an explicit stack of (node, iterator over its arcs), so there's no limit on
+    # how deep the search can go.
+    adj_list = g.adj_list
+    index = {}
+    low = {}
+    stack = []
+    onstack = set()
+    result = []
 
-        if ex.origin in sterminus and ex.terminus in sterminus:
+    for root in g.nodes():
+        if root in index:
             continue
 
-        tmpset = sorigin | sterminus
-        for n in tmpset:
-            lookup[n] = tmpset
-        mstedges.add(ex)
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        onstack.add(root)
+        work = [(root, iter(adj_list[root]))]
+        while work:
+            v, arcs = work[-1]
+            for w, cost in arcs:
+                if w not in index:
+                    index[w] = low[w] = len(index)
+                    stack.append(w)
+                    onstack.add(w)
+                    work.append((w, iter(adj_list[w])))
+                    break
+                if w in onstack and index[w] < low[v]:
+                    low[v] = index[w]
+            else:
+                # done with v's arcs
+                work.pop()
+                if work and low[v] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[v]
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        onstack.discard(w)
+                        component.append(w)
+                        if w == v:
+                            break
+                    result.append(component)
+
+    return result
+
+
+def condensation(g):
+    '''
+    collapse every strongly connected component of g to a single node.  returns (c, membership):  c is a DGraph
+    (and a DAG) whose nodes are labelled 0, 1, ... in topological order, with an edge between two components
+    wherever g has one, at the cheapest such cost.  membership maps each node of g to its node in c.
+    '''
+    components = scc(g)
+    components.reverse()
 
-        if tmpset == allnodes:
+    componentof = {}
+    for i, members in enumerate(components):
+        for n in members:
+            componentof[n] = i
+
+    cheapest = {}
+    adj_list = g.adj_list
+    for n in g.nodes():
+        i = componentof[n]
+        for w, cost in adj_list[n]:
+            j = componentof[w]
+            if i != j and ((i, j) not in cheapest or cost < cheapest[(i, j)]):
+                cheapest[(i, j)] = cost
+
+    c = DGraph._fromindexed(range(len(components)), [(i, j, cost) for (i, j), cost in cheapest.items()])
+    cnodes = dict((n.label, n) for n in c.nodes())
+    membership = dict((n, cnodes[i]) for n, i in componentof.items())
+    return c, membership
+
+
+def maxflow(g, s, t):
+    '''
+    maximum flow from s to t, taking edge costs as capacities (dinic's algorithm).  parallel edges are separate
+    arcs, each with its own capacity.  returns (value, flows, cut):  flows lists (origin, terminus, capacity, flow)
+    for every arc of g, in adj_list order, and cut is the set of nodes on the source side of a minimum cut.
+    '''
+    for n in (s, t):
+        if not g.contains(n):
+            raise GraphException("node %s not in graph" % n)
+    if s == t:
+        raise GraphException("source and sink are the same node")
+
+    # residual network over integer ids.  arc 2k is the kth arc of g and arc 2k+1 its reverse; head holds where
+    # each arc goes, residual its remaining capacity, and out[v] the ids of the arcs leaving v.
+    nodes = list(g.nodes())
+    index = dict((n, i) for i, n in enumerate(nodes))
+    head = []
+    residual = []
+    out = [[] for _ in nodes]
+    originals = []
+    for n in nodes:
+        u = index[n]
+        for terminus, capacity in g.adj_list[n]:
+            if capacity < 0:
+                raise GraphException("edge from %s to %s has negative capacity" % (n, terminus))
+            v = index[terminus]
+            out[u].append(len(head))
+            head.append(v)
+            residual.append(capacity)
+            out[v].append(len(head))
+            head.append(u)
+            residual.append(0)
+            originals.append((n, terminus, capacity))
+
+    source = index[s]
+    sink = index[t]
+    value = 0
+    while True:
+        # bfs levels over arcs with capacity left
+        level = [-1] * len(nodes)
+        level[source] = 0
+        q = collections.deque([source])
+        while q:
+            v = q.popleft()
+            for a in out[v]:
+                if residual[a] > 0 and level[head[a]] < 0:
+                    level[head[a]] = level[v] + 1
+                    q.append(head[a])
+        if level[sink] < 0:
             break
 
+        # blocking flow:  walk forward along level-increasing arcs, remembering in nextarc how far each node's
+        # arcs have been tried, so every arc is given up on at most once per phase.
+        nextarc = [0] * len(nodes)
+        path = []
+        v = source
+        while True:
+            if v == sink:
+                pushed = min(residual[a] for a in path)
+                for a in path:
+                    residual[a] -= pushed
+                    residual[a ^ 1] += pushed
+                value += pushed
+                # back up to just before the first arc that filled up
+                k = next(i for i, a in enumerate(path) if residual[a] == 0)
+                del path[k:]
+                v = head[path[-1]] if path else source
+                continue
+
+            arcs = out[v]
+            i = nextarc[v]
+            while i < len(arcs) and not (residual[arcs[i]] > 0 and level[head[arcs[i]]] == level[v] + 1):
+                i += 1
+            nextarc[v] = i
+            if i < len(arcs):
+                path.append(arcs[i])
+                v = head[arcs[i]]
+            elif v == source:
+                break
+            else:
+                # dead end; retreat, and don't come back here this phase
+                level[v] = -1
+                a = path.pop()
+                v = head[a ^ 1]
+                nextarc[v] += 1
+
+    cut = set(nodes[i] for i, x in enumerate(level) if x >= 0)
+    flows = [(a, b, capacity, residual[2 * k + 1]) for k, (a, b, capacity) in enumerate(originals)]
+    return value, flows, cut
+
+
+def allpairs(g, sources=None, processes=None, method=None):
+    '''
+    shortest-path distances from many sources, every node by default.  yields one (source, dist) pair per source,
+    dist being a dict like the one dijkstra returns, so the whole table is never held in memory at once.
+
+    method 'dijkstra' runs one search per source, spread over a pool of processes worker processes (one per cpu by
+    default; processes=1 stays in this process).  method 'floyd' runs floyd-warshall over a dense matrix instead,
+    which is cheaper for small, dense graphs.  if method is None, it is picked from the size and density of g.
+    '''
+    if sources is None:
+        sources = list(g.nodes())
+    else:
+        sources = list(sources)
+        for n in sources:
+            if not g.contains(n):
+                raise GraphException("node %s not in graph" % n)
+
+    if method is None:
+        nnodes = len(g)
+        narcs = sum(len(g.adj_list[n]) for n in g.nodes())
+        method = 'floyd' if nnodes <= _FLOYD_MAX_NODES and narcs * 4 >= nnodes * nnodes else 'dijkstra'
+
+    if method == 'floyd':
+        return _floydwarshall(g, sources)
+    if method == 'dijkstra':
+        return _poolmap(g, _distrow, sources, processes)
+    raise GraphException("unknown all-pairs method %r" % method)
+
+
+# largest graph allpairs will consider running floyd-warshall on
+_FLOYD_MAX_NODES = 200
+
+# jobs handed to the pool at a time, per worker.  bounds how many finished results can pile up waiting for the
+# consumer.
+_JOBS_IN_FLIGHT = 16
+
+# the graph the pool workers search.  it reaches them when the pool forks, so it isn't copied or pickled.
+_workergraph = None
+
+
+def _initworker(g):
+    global _workergraph
+    _workergraph = g
+
+
+def _runjob(job):
+    func, item = job
+    return func(_workergraph, item)
+
+
+def _poolmap(g, func, items, processes):
+    # yields func(g, item) for each item, in order.  with processes > 1 (default: one per cpu), the calls are
+    # spread over a pool of worker processes that share g; func has to be a module-level function so that the
+    # workers can find it.
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1 or len(items) <= 1:
+        for item in items:
+            yield func(g, item)
+        return
+
+    pool = multiprocessing.Pool(processes, _initworker, (g,))
+    try:
+        window = processes * _JOBS_IN_FLIGHT
+        chunksize = max(1, _JOBS_IN_FLIGHT // 4)
+        for lo in range(0, len(items), window):
+            for result in pool.imap(_runjob, [(func, x) for x in items[lo:lo + window]], chunksize):
+                yield result
+        pool.close()
+    finally:
+        # also reached when the caller stops iterating early
+        pool.terminate()
+        pool.join()
+
+
+def _distrow(g, source):
+    return source, g.dijkstra(source)[0]
+
+
+def _floydwarshall(g, sources):
+    nodes = list(g.nodes())
+    index = dict((n, i) for i, n in enumerate(nodes))
+    inf = float('inf')
+
+    d = [[inf] * len(nodes) for _ in nodes]
+    for i, n in enumerate(nodes):
+        row = d[i]
+        for terminus, cost in g.adj_list[n]:
+            j = index[terminus]
+            if cost < row[j]:
+                row[j] = cost
+        if row[i] > 0:
+            row[i] = 0
+
+    for k in range(len(nodes)):
+        rowk = d[k]
+        for i in range(len(nodes)):
+            dik = d[i][k]
+            if dik == inf:
+                continue
+            # relax the whole row at once
+            d[i] = [x if x <= dik + y else dik + y for x, y in itertools.izip(d[i], rowk)]
+
+    for n in sources:
+        row = d[index[n]]
+        yield n, dict((nodes[j], x) for j, x in enumerate(row) if x != inf)
+
+
+def prim(g, forest=True):
+    # return a MST for this graph using prim's algorithm:  grow a tree from one node, always adding the cheapest
+    # edge that leaves it, found with a heap.  if the graph isn't connected, grow a tree in every component to get
+    # a minimum spanning forest, or raise GraphException if forest is False.
+
+    adj_list = g.adj_list
     returnme = UGraph()
-    for n in allnodes:
+    for n in g.nodes():
         returnme.addnode(n)
 
-    for ex in mstedges:
-        returnme.addedge(ex.origin, ex.terminus, ex.cost)
+    intree = set()
+    # cheapest known edge cost into each node not yet in the tree; used to keep hopeless edges off the heap
+    best = {}
+    pushes = 0
+    for root in g.nodes():
+        if root in intree:
+            continue
+        if intree and not forest:
+            raise GraphException("graph is not connected")
+
+        intree.add(root)
+        heap = []
+        for v, cost in adj_list[root]:
+            if v not in intree and (v not in best or cost < best[v]):
+                best[v] = cost
+                heap.append((cost, pushes, root, v))
+                pushes += 1
+        heapq.heapify(heap)
+
+        while heap:
+            cost, _, a, b = heapq.heappop(heap)
+            if b in intree:
+                continue
+            intree.add(b)
+            returnme.addedge(a, b, cost)
+            for v, c in adj_list[b]:
+                if v not in intree and (v not in best or c < best[v]):
+                    best[v] = c
+                    heapq.heappush(heap, (c, pushes, b, v))
+                    pushes += 1
+
     return returnme
+
+
+# mst() uses prim when there are at least this many edges per node, kruskal otherwise
+_PRIM_EDGES_PER_NODE = 4
+
+
+def mst(g):
+    # return a minimum spanning tree (or forest) of g, picking prim for dense graphs and kruskal for sparse ones.
+    narcs = sum(len(g.adj_list[n]) for n in g.nodes())
+    if narcs >= 2 * _PRIM_EDGES_PER_NODE * len(g):
+        return prim(g)
+    return kruskal(g)
+
+##########    ##########    ##########    ##########    ##########
+# random graphs.  nodes are labelled 0 .. n-1.  cls is the kind of graph to build:  a DGraph subclass gives directed
+# edges, a UGraph subclass undirected ones, and CompactDGraph or CompactUGraph skip the dict-based adjacency
+# altogether.  the edges go straight into the new graph by node index, the same way the bulk loaders build it.
+# edge costs are 1, or drawn uniformly from 1 .. maxcost if that is given.  seed makes the graph reproducible.
+
+
+def _costfunc(rng, maxcost):
+    if maxcost is None:
+        return lambda: 1
+    return lambda: rng.randint(1, maxcost)
+
+
+def _pair(k, n, directed):
+    # the pair of nodes numbered k.  directed pairs are the ordered (u, w) with w != u, n - 1 to a row;
+    # undirected pairs are (u, w) with w < u, so row u holds u of them and starts at u * (u - 1) / 2.
+    if directed:
+        u, w = divmod(k, n - 1)
+        if w >= u:
+            w += 1
+        return u, w
+
+    u = int((1 + math.sqrt(1 + 8 * k)) / 2)
+    # the square root can be off by one for big k
+    while u * (u - 1) // 2 > k:
+        u -= 1
+    while (u + 1) * u // 2 <= k:
+        u += 1
+    return u, k - u * (u - 1) // 2
+
+
+@_pausegc
+def gnp(n, p, cls=UGraph, maxcost=None, seed=None):
+    '''
+    G(n, p):  every possible edge (no self-loops) is present with probability p.
+    '''
+    # rather than flipping a coin per pair, draw the geometrically distributed gaps between the pairs that come
+    # up heads (batagelj & brandes), so the work is proportional to the number of edges.
+    if not 0 <= p <= 1:
+        raise GraphException("p must be between 0 and 1")
+    rng = random.Random(seed)
+    cost = _costfunc(rng, maxcost)
+    directed = not issubclass(cls, UGraph)
+    edges = []
+
+    if n > 1 and p > 0:
+        npairs = n * (n - 1) if directed else n * (n - 1) // 2
+        logq = math.log(1 - p) if p < 1 else None
+        k = -1
+        while True:
+            k += 1
+            if logq is not None:
+                k += int(math.log(1 - rng.random()) / logq)
+            if k >= npairs:
+                break
+            u, w = _pair(k, n, directed)
+            edges.append((u, w, cost()))
+
+    return cls._fromindexed(range(n), edges)
+
+
+@_pausegc
+def gnm(n, m, cls=UGraph, maxcost=None, seed=None):
+    '''
+    G(n, m):  m distinct edges (no self-loops) picked uniformly at random.
+    '''
+    directed = not issubclass(cls, UGraph)
+    npairs = n * (n - 1) if directed else n * (n - 1) // 2
+    if not 0 <= m <= npairs:
+        raise GraphException("can't put %d edges in a graph with %d nodes" % (m, n))
+    rng = random.Random(seed)
+    cost = _costfunc(rng, maxcost)
+
+    # pick pair numbers without replacement
+    if m * 2 > npairs:
+        picked = rng.sample(range(npairs), m)
+    else:
+        picked = set()
+        while len(picked) < m:
+            picked.add(rng.randrange(npairs))
+
+    edges = []
+    for k in picked:
+        u, w = _pair(k, n, directed)
+        edges.append((u, w, cost()))
+
+    return cls._fromindexed(range(n), edges)
+
+
+@_pausegc
+def barabasi_albert(n, m, cls=UGraph, maxcost=None, seed=None):
+    '''
+    preferential attachment:  nodes m .. n-1 arrive one at a time and each links to m distinct earlier nodes,
+    chosen with probability proportional to their degree.  gives a power-law degree distribution.
+    '''
+    if not 1 <= m < n:
+        raise GraphException("need 1 <= m < n")
+    rng = random.Random(seed)
+    cost = _costfunc(rng, maxcost)
+
+    edges = []
+    # every edge endpoint so far; picking uniformly from it is picking a node in proportion to its degree.  the
+    # first arrival has nothing to go on, so it links to all of the initial nodes.
+    endpoints = []
+    for v in range(m, n):
+        if endpoints:
+            targets = set()
+            while len(targets) < m:
+                targets.add(endpoints[int(rng.random() * len(endpoints))])
+        else:
+            targets = range(m)
+        for t in targets:
+            edges.append((v, t, cost()))
+            endpoints.append(t)
+            endpoints.append(v)
+
+    return cls._fromindexed(range(n), edges)
+
+
+@_pausegc
+def gridgraph(rows, cols, cls=UGraph, maxcost=None, seed=None):
+    '''
+    rows x cols lattice.  the node in row r, column c is labelled r * cols + c and is joined to its right and
+    lower neighbors (and they to it, in a UGraph).
+    '''
+    rng = random.Random(seed)
+    cost = _costfunc(rng, maxcost)
+    edges = []
+    for r in range(rows):
+        for c in range(cols):
+            i = r * cols + c
+            if c + 1 < cols:
+                edges.append((i, i + 1, cost()))
+            if r + 1 < rows:
+                edges.append((i, i + cols, cost()))
+    return cls._fromindexed(range(rows * cols), edges)
+
+
+@_pausegc
+def geometric(n, radius, cls=UGraph, seed=None):
+    '''
+    random geometric graph:  n points dropped uniformly in the unit square, with an edge between every two that
+    are within radius of each other.  the cost of an edge is the distance between its ends.
+    '''
+    if radius <= 0:
+        raise GraphException("radius must be positive")
+    rng = random.Random(seed)
+    points = [(rng.random(), rng.random()) for _ in range(n)]
+    directed = not issubclass(cls, UGraph)
+
+    # bucket the points into radius x radius cells, so each point only has to be compared with the points in its
+    # own cell and the ones around it
+    cells = {}
+    for i, (x, y) in enumerate(points):
+        cells.setdefault((int(x / radius), int(y / radius)), []).append(i)
+
+    edges = []
+    r2 = radius * radius
+    for (cx, cy), members in cells.items():
+        nearby = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                nearby.extend(cells.get((cx + dx, cy + dy), ()))
+        for i in members:
+            x, y = points[i]
+            for j in nearby:
+                if j > i:
+                    d2 = (points[j][0] - x) ** 2 + (points[j][1] - y) ** 2
+                    if d2 <= r2:
+                        edges.append((i, j, math.sqrt(d2)))
+                        if directed:
+                            edges.append((j, i, math.sqrt(d2)))
+
+    return cls._fromindexed(range(n), edges)
+
+
+# binary graph files look like this, all little-endian:
+#
+#   header:   magic 'GRPH', format version (uint32), flags (uint32, bit 0 set for undirected graphs),
+#             cost type ('q' or 'd', then 3 pad bytes), node count, arc count, label table size (uint64 each)
+#   labels:   the node labels as a pickled list, padded to a multiple of 8 bytes
+#   offsets:  node count + 1 int64s
+#   targets:  arc count int64s
+#   costs:    arc count int64s or doubles
+#
+# this is the CSR layout of CompactDGraph, so load() can use the file as it is.
+
+_MAGIC = 'GRPH'
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sIIc3xQQQ')
+_UNDIRECTED = 1
+
+
+def _writenumbers(f, seq, fmt):
+    chunk = []
+    for x in seq:
+        chunk.append(x)
+        if len(chunk) == 65536:
+            f.write(struct.pack('<%d%s' % (len(chunk), fmt), *chunk))
+            chunk = []
+    if chunk:
+        f.write(struct.pack('<%d%s' % (len(chunk), fmt), *chunk))
+
+
+def save(g, path):
+    '''
+    write g to path in the binary graph format.  the graph is compacted first if it isn't already.
+    '''
+    try:
+        adj = g.compact().adj_list
+    except TypeError:
+        raise GraphException("can't save %s:  edge costs must be numbers" % path)
+    except OverflowError:
+        raise GraphException("can't save %s:  integer edge costs must fit in 64 bits" % path)
+    costfmt = 'd' if adj.costs.typecode == 'd' else 'q'
+    labels = pickle.dumps([n.label for n in adj.labels], pickle.HIGHEST_PROTOCOL)
+    labels += '\0' * (-len(labels) % 8)
+    flags = _UNDIRECTED if isinstance(g, UGraph) else 0
+
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, flags, costfmt, len(adj.labels), len(adj.targets), len(labels)))
+        f.write(labels)
+        _writenumbers(f, adj.offsets, 'q')
+        _writenumbers(f, adj.targets, 'q')
+        _writenumbers(f, adj.costs, costfmt)
+
+
+def load(path):
+    '''
+    memory-map a file written by save() and return it as a CompactDGraph or CompactUGraph.  the offsets, targets
+    and costs are read straight from the mapping, so processes that load the same file share one copy of it.
+    only load files you trust:  the label table is a pickle.
+    '''
+    with open(path, 'rb') as f:
+        # mmap can't map an empty file, and anything shorter than the header isn't one of ours anyway
+        if os.fstat(f.fileno()).st_size < _HEADER.size:
+            raise GraphException("%s is not a graph file" % path)
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, flags, costfmt, nnodes, narcs, labelsize = _HEADER.unpack_from(buf, 0)
+    if magic != _MAGIC:
+        raise GraphException("%s is not a graph file" % path)
+    if version != _FORMAT_VERSION:
+        raise GraphException("%s has unsupported format version %d" % (path, version))
+
+    pos = _HEADER.size
+    labels = [Node(x) for x in pickle.loads(buf[pos:pos + labelsize])]
+    pos += labelsize
+    offsets = MappedArray(buf, pos, nnodes + 1, 'q')
+    pos += 8 * (nnodes + 1)
+    targets = MappedArray(buf, pos, narcs, 'q')
+    pos += 8 * narcs
+    costs = MappedArray(buf, pos, narcs, costfmt)
+    if pos + 8 * narcs > len(buf):
+        raise GraphException("%s is truncated" % path)
+
+    cls = CompactUGraph if flags & _UNDIRECTED else CompactDGraph
+    return cls(labels, offsets, targets, costs)
@@ -1,5 +1,10 @@
 #!/usr/bin/env python
 
+import os
+import pickle
+import random
+import shutil
+import tempfile
 import unittest
 import graph
 
@@ -28,6 +33,27 @@ class TestNode(unittest.TestCase):
         q = graph.Node('ueoa')
         self.assertNotEqual(q, m)
 
+    def test_slots(self):
+        n = graph.Node('a')
+        with self.assertRaises(AttributeError):
+            n.color = 'red'
+        e = graph.Edge(n, graph.Node('b'), 3)
+        with self.assertRaises(AttributeError):
+            e.color = 'red'
+        for x in (n, e):
+            self.assertEqual(x, pickle.loads(pickle.dumps(x)))
+            self.assertEqual(x, pickle.loads(pickle.dumps(x, pickle.HIGHEST_PROTOCOL)))
+
+    def test_intern(self):
+        a = graph.Node.intern('a')
+        self.assertTrue(a is graph.Node.intern('a'))
+        self.assertEqual(graph.Node('a'), a)
+        self.assertFalse(a is graph.Node.intern('b'))
+
+        # the bulk loaders share nodes between edges
+        g = graph.DGraph.fromedges([('x', 'y'), ('z', 'y')])
+        self.assertTrue(g.adj_list[graph.Node('x')][0][0] is g.adj_list[graph.Node('z')][0][0])
+
     def test_cmp(self):
         a = graph.Node('aaa')
         b = graph.Node('bbb')
@@ -77,6 +103,104 @@ class TestDGraph(unittest.TestCase):
         # adding an edge twice is ok
         g.addedge(a, b)
 
+    def test_multiedges(self):
+        a, b, c = [graph.Node(x) for x in 'abc']
+        edges = [('a', 'b', 5), ('a', 'b', 3), ('b', 'c', 2), ('a', 'b', 4)]
+        expected = {'allow': [(b, 5), (b, 3), (b, 4)], 'min': [(b, 3)], 'last': [(b, 4)]}
+        for policy, arcs in expected.items():
+            # the same whether the edges go in one at a time or all at once
+            g = graph.DGraph(multiedges=policy)
+            g.addnodes(a, b, c)
+            for x, y, cost in edges:
+                g.addedge(graph.Node(x), graph.Node(y), cost)
+            self.assertEqual(arcs, g.adj_list[a])
+            self.assertEqual(arcs, graph.DGraph.fromedges(edges, multiedges=policy).adj_list[a])
+            self.assertTrue(g.hasedge(a, b))
+            self.assertFalse(g.hasedge(b, a))
+            self.assertEqual(min(cost for _, cost in arcs), g.edgecost(a, b))
+
+            g.addedges([('a', 'b', 1), ('c', 'a', 6)])
+            self.assertEqual(1, g.edgecost(a, b))
+            g.removeedge(a, b)
+            self.assertFalse(g.hasedge(a, b))
+            self.assertEqual(6, g.edgecost(c, a))
+            with self.assertRaises(graph.GraphException):
+                g.edgecost(a, c)
+
+        g = graph.DGraph.fromedges(edges[:1], multiedges='reject')
+        with self.assertRaises(graph.GraphException):
+            g.addedge(a, b, 7)
+        # nothing is added if any edge is a repeat
+        with self.assertRaises(graph.GraphException):
+            g.addedges([('b', 'c'), ('c', 'a'), ('c', 'a')])
+        with self.assertRaises(graph.GraphException):
+            g.addedges([('b', 'c'), ('a', 'b')])
+        self.assertEqual(2, len(g))
+        self.assertEqual('reject', g.multiedges)
+        with self.assertRaises(graph.GraphException):
+            graph.DGraph(multiedges='sometimes')
+
+        # undirected graphs apply the policy to both directions
+        u = graph.UGraph.fromedges([('a', 'b', 5), ('b', 'a', 3), ('c', 'c', 1)], multiedges='min')
+        self.assertEqual([(b, 3)], u.adj_list[a])
+        self.assertEqual([(a, 3)], u.adj_list[b])
+        self.assertEqual([(c, 1)], u.adj_list[c])
+        u.addedge(c, c, 2)
+        u.addedge(b, a, 1)
+        self.assertEqual([(c, 1)], u.adj_list[c])
+        self.assertEqual(1, u.edgecost(a, b))
+        self.assertEqual(1, u.compact().edgecost(b, a))
+        self.assertTrue(graph.subgraph(u, maxcost=1).hasedge(a, b))
+        self.assertFalse(graph.subgraph(u, maxcost=0).hasedge(a, b))
+
+        # the compact graphs take the same policies when they're built
+        for cls in (graph.CompactDGraph, graph.CompactUGraph):
+            plain = graph.UGraph if cls is graph.CompactUGraph else graph.DGraph
+            for policy in ('allow', 'min', 'last'):
+                c = cls.fromedges(edges + [('c', 'c', 1), ('c', 'c', 2)], multiedges=policy)
+                p = plain.fromedges(edges + [('c', 'c', 1), ('c', 'c', 2)], multiedges=policy)
+                self.assertEqual(policy, c.multiedges)
+                self.assertEqual(sorted(p.arcs()), sorted(c.arcs()))
+                self.assertEqual(p.edgecost(a, b), c.edgecost(a, b))
+            with self.assertRaises(graph.GraphException):
+                cls.fromedges(edges, multiedges='reject')
+            with self.assertRaises(graph.GraphException):
+                cls.fromedges(edges, multiedges='sometimes')
+            self.assertEqual(1, len(list(cls.fromedges(edges[:1], multiedges='reject').arcs())))
+
+    def test_addedges(self):
+        g = graph.DGraph()
+        a = graph.Node('a')
+        g.addnode(a)
+        g.addedges([(a, 'b', 2), ('b', 'c')])
+        b = graph.Node('b')
+        c = graph.Node('c')
+        self.assertEqual(3, len(g))
+        self.assertEqual([(b, 2)], g.adj_list[a])
+        self.assertEqual([(c, 1)], g.adj_list[b])
+        self.assertEqual([], g.adj_list[c])
+
+        # a bad edge anywhere in the batch means nothing gets added
+        with self.assertRaises(graph.GraphException):
+            g.addedges([(a, c, 1), (a,)])
+        self.assertEqual([(b, 2)], g.adj_list[a])
+
+        # cached neighbor lists are refreshed
+        self.assertEqual([b], list(g.neighbors(a)))
+        g.addedges([(a, c)])
+        self.assertEqual([b, c], list(g.neighbors(a)))
+
+    def test_fromedges(self):
+        g = graph.UGraph.fromedges([('a', 'b', 3), ('b', 'c', 4)], nodes=['d'])
+        self.assertTrue(isinstance(g, graph.UGraph))
+        self.assertEqual(4, len(g))
+        self.assertEqual('abc', graph.dfs(g, graph.Node('a')))
+        self.assertEqual('d', graph.dfs(g, graph.Node('d')))
+        self.assertEqual(7, g.shortestpath(graph.Node('a'), graph.Node('c'))[0])
+
+        with self.assertRaises(graph.GraphException):
+            graph.DGraph.fromedges([], nodes=['a', 'a'])
+
     def test_dijkstra(self):
         a = graph.Node('1')
         b = graph.Node('2')
@@ -94,8 +218,529 @@ class TestDGraph(unittest.TestCase):
         gr.addedge(d, e, 60)
         gr.addedge(d, c, 20)
 
+        dist, pred = gr.dijkstra(a)
+        self.assertEqual({a: 0, b: 10, c: 50, d: 30, e: 60}, dist)
+        self.assertEqual([a, d, c, e], graph.getpath(pred, e))
+
+        # nothing leaves e, so only e itself is reachable
+        dist, pred = gr.dijkstra(e)
+        self.assertEqual({e: 0}, dist)
+        self.assertEqual({}, pred)
+
+    def test_point_to_point(self):
+        rng = random.Random(1234)
+        for trial in range(20):
+            edges = [(rng.randrange(30), rng.randrange(30), rng.randint(1, 20)) for _ in range(80)]
+            gr = graph.DGraph.fromedges(edges, nodes=[n for n in range(30) if n not in
+                                                      set(x for e in edges for x in e[:2])])
+            for _ in range(10):
+                a = graph.Node(rng.randrange(30))
+                b = graph.Node(rng.randrange(30))
+                cost, path = gr.shortestpath(a, b)
+                for other in (gr.bidijkstra(a, b), gr.astar(a, b, lambda n, target: 0)):
+                    self.assertEqual(cost, other[0])
+                    if cost is None:
+                        self.assertEqual([], other[1])
+                        continue
+                    # the path may differ, but it has to go from a to b and cost what it says
+                    self.assertEqual(a, other[1][0])
+                    self.assertEqual(b, other[1][-1])
+                    hops = zip(other[1], other[1][1:])
+                    self.assertEqual(cost, sum(min(c for t, c in gr.adj_list[x] if t == y) for x, y in hops))
+
+        # the backward search has to notice new edges
+        gr = graph.DGraph.fromedges([('a', 'b')], nodes=['c'])
+        a, c = graph.Node('a'), graph.Node('c')
+        self.assertEqual((None, []), gr.bidijkstra(a, c))
+        gr.addedge(graph.Node('b'), c)
+        self.assertEqual(2, gr.bidijkstra(a, c)[0])
+
+    def test_astar_grid(self):
+        # 10x10 grid, unit costs, manhattan distance heuristic
+        edges = []
+        for x in range(10):
+            for y in range(10):
+                if x < 9:
+                    edges.append(((x, y), (x + 1, y)))
+                if y < 9:
+                    edges.append(((x, y), (x, y + 1)))
+        gr = graph.UGraph.fromedges(edges)
+
+        def manhattan(n, target):
+            return abs(n.label[0] - target.label[0]) + abs(n.label[1] - target.label[1])
+
+        cost, path = gr.astar(graph.Node((0, 0)), graph.Node((9, 9)), manhattan)
+        self.assertEqual(18, cost)
+        self.assertEqual(19, len(path))
+        self.assertEqual(18, gr.bidijkstra(graph.Node((0, 0)), graph.Node((9, 9)))[0])
+        self.assertEqual((0, [graph.Node((3, 3))]), gr.bidijkstra(graph.Node((3, 3)), graph.Node((3, 3))))
+
+    def test_remove_update(self):
+        gr = graph.DGraph.fromedges([('a', 'b', 1), ('a', 'b', 2), ('b', 'c', 1), ('c', 'a', 4)])
+        a, b, c = [graph.Node(x) for x in 'abc']
+
+        self.assertEqual(2, gr.shortestpath(a, c)[0])
+        gr.removeedge(a, b, 1)
+        self.assertEqual([(b, 2)], gr.adj_list[a])
+        self.assertEqual(3, gr.shortestpath(a, c)[0])
+        gr.updatecost(a, b, 7)
+        self.assertEqual(8, gr.shortestpath(a, c)[0])
+        self.assertEqual(8, gr.bidijkstra(a, c)[0])
+
+        with self.assertRaises(graph.GraphException):
+            gr.removeedge(b, a)
+        with self.assertRaises(graph.GraphException):
+            gr.updatecost(b, a, 1)
+
+        gr.removenode(b)
+        self.assertEqual(2, len(gr))
+        self.assertEqual([], gr.adj_list[a])
+        self.assertEqual([a], list(gr.neighbors(c)))
+        with self.assertRaises(graph.GraphException):
+            gr.removenode(b)
+
+        u = graph.UGraph.fromedges([('a', 'b', 1), ('b', 'c', 1)])
+        components = u.trackcomponents()
+        self.assertEqual(1, components.count)
+        u.removeedge(b, c)
+        self.assertEqual([], u.adj_list[c])
+        self.assertEqual(2, components.count)
+        u.updatecost(b, a, 5)
+        self.assertEqual([(b, 5)], u.adj_list[a])
+        u.removenode(a)
+        self.assertEqual('b', graph.dfs(u, b))
+        self.assertEqual(2, components.count)
+
+    def test_repairdijkstra(self):
+        rng = random.Random(99)
+        for trial in range(30):
+            gr = graph.DGraph.fromedges([(rng.randrange(25), rng.randrange(25), rng.randint(1, 10))
+                                         for _ in range(70)], nodes=[0])
+            source = graph.Node(0)
+            dist, pred = gr.dijkstra(source)
+
+            changed = []
+            nodes = sorted(gr.nodes())
+            for _ in range(4):
+                what = rng.randrange(4)
+                a = rng.choice(nodes)
+                arcs = gr.adj_list[a]
+                if what == 0 or not arcs:
+                    b = rng.choice(nodes)
+                    gr.addedge(a, b, rng.randint(1, 10))
+                elif what == 1:
+                    b = rng.choice(arcs)[0]
+                    gr.removeedge(a, b)
+                elif what == 2:
+                    b = rng.choice(arcs)[0]
+                    gr.updatecost(a, b, rng.randint(1, 10))
+                else:
+                    b = rng.choice(arcs)[0]
+                    if b == source:
+                        continue
+                    gr.removenode(b)
+                    nodes.remove(b)
+                changed.append((a, b))
+
+            newdist, newpred = gr.repairdijkstra(source, dist, pred, changed)
+            self.assertEqual(gr.dijkstra(source)[0], newdist)
+            for v, p in newpred.items():
+                self.assertTrue(any(t == v and newdist[p] + cost == newdist[v] for t, cost in gr.adj_list[p]))
+
+    def test_toposort(self):
+        gr = graph.DGraph.fromedges([('shop', 'cook', 30), ('cook', 'eat', 60), ('shop', 'bake', 20),
+                                     ('bake', 'eat', 90), ('wake', 'shop', 5)], nodes=['nap'])
+        order = graph.toposort(gr)
+        self.assertEqual(6, len(order))
+        position = dict((n, i) for i, n in enumerate(order))
+        for e in gr.edges():
+            self.assertTrue(position[e.origin] < position[e.terminus])
+
+        wake, shop, bake, eat = [graph.Node(x) for x in ('wake', 'shop', 'bake', 'eat')]
+        self.assertEqual((115, [wake, shop, bake, eat]), graph.criticalpath(gr))
+
+        dist, pred = graph.dagpaths(gr, wake)
+        self.assertEqual(95, dist[eat])
+        self.assertEqual(5, len(dist))
+        dist, pred = graph.dagpaths(gr, wake, longest=True)
+        self.assertEqual(115, dist[eat])
+        self.assertEqual([wake, shop, bake, eat], graph.getpath(pred, eat))
+
+        # negative costs are fine
+        gr.addedge(wake, eat, -10)
+        self.assertEqual(-10, graph.dagpaths(gr, wake)[0][eat])
+
+        gr.addedge(eat, shop)
+        with self.assertRaises(graph.CycleException) as cm:
+            graph.toposort(gr)
+        cycle = cm.exception.cycle
+        self.assertEqual(cycle[0], cycle[-1])
+        self.assertTrue(set(cycle) <= set([shop, graph.Node('cook'), bake, eat]))
+        for x, y in zip(cycle, cycle[1:]):
+            self.assertTrue(y in list(gr.neighbors(x)))
+        with self.assertRaises(graph.GraphException):
+            graph.criticalpath(gr)
+
+    def test_scc(self):
+        # sedgewick's tinyDG
+        edges = [(4, 2), (2, 3), (3, 2), (6, 0), (0, 1), (2, 0), (11, 12), (12, 9), (9, 10), (9, 11), (7, 9),
+                 (10, 12), (11, 4), (4, 3), (3, 5), (6, 8), (8, 6), (5, 4), (0, 5), (6, 4), (6, 9), (7, 6)]
+        gr = graph.DGraph.fromedges(edges)
+        components = graph.scc(gr)
+        self.assertEqual([[0, 2, 3, 4, 5], [1], [6, 8], [7], [9, 10, 11, 12]],
+                         sorted(sorted(n.label for n in c) for c in components))
+
+        # nothing in a component can reach an earlier one
+        position = dict((n, i) for i, c in enumerate(components) for n in c)
+        for e in gr.edges():
+            self.assertTrue(position[e.origin] >= position[e.terminus])
+
+        c, membership = graph.condensation(gr)
+        self.assertEqual(5, len(c))
+        self.assertEqual(13, len(membership))
+        self.assertEqual(membership[graph.Node(0)], membership[graph.Node(4)])
+        self.assertNotEqual(membership[graph.Node(6)], membership[graph.Node(7)])
+        # labelled in topological order
+        for e in c.edges():
+            self.assertTrue(e.origin.label < e.terminus.label)
+        self.assertEqual(5, len(list(graph.iterdfs(c, membership[graph.Node(7)]))))
+
+    def test_reachability(self):
+        rng = random.Random(5)
+        gr = graph.gnm(40, 70, cls=graph.DGraph, seed=5)
+        index = graph.ReachabilityIndex(gr)
+        for a in gr.nodes():
+            reach = set(graph.iterdfs(gr, a))
+            for b in gr.nodes():
+                self.assertEqual(b in reach, index.reachable(a, b))
+
+        with self.assertRaises(graph.GraphException):
+            index.reachable(graph.Node(0), graph.Node('nope'))
+
+        # adding an edge is picked up on the next query
+        a, b = graph.Node(0), graph.Node(1)
+        while index.reachable(a, b):
+            a, b = [graph.Node(x) for x in rng.sample(range(40), 2)]
+        gr.addedge(a, b)
+        self.assertTrue(index.reachable(a, b))
+
+    def assertValidFlow(self, gr, s, t, value, flows, cut):
+        balance = dict((n, 0) for n in gr.nodes())
+        for a, b, capacity, flow in flows:
+            self.assertTrue(0 <= flow <= capacity)
+            balance[a] -= flow
+            balance[b] += flow
+        for n, x in balance.items():
+            self.assertEqual({s: -value, t: value}.get(n, 0), x)
+
+        # max flow equals min cut
+        self.assertTrue(s in cut)
+        self.assertFalse(t in cut)
+        self.assertEqual(value, sum(capacity for a, b, capacity, flow in flows if a in cut and b not in cut))
+
+    def test_maxflow(self):
+        # clrs, figure 26.1
+        edges = [('s', 'v1', 16), ('s', 'v2', 13), ('v2', 'v1', 4), ('v1', 'v3', 12), ('v3', 'v2', 9),
+                 ('v2', 'v4', 14), ('v4', 'v3', 7), ('v3', 't', 20), ('v4', 't', 4)]
+        gr = graph.DGraph.fromedges(edges)
+        s, t = graph.Node('s'), graph.Node('t')
+        value, flows, cut = graph.maxflow(gr, s, t)
+        self.assertEqual(23, value)
+        self.assertEqual(len(edges), len(flows))
+        self.assertValidFlow(gr, s, t, value, flows, cut)
+
+        # parallel edges add up
+        gr.addedge(graph.Node('v4'), t, 3)
+        value, flows, cut = graph.maxflow(gr, s, t)
+        self.assertEqual(25, value)
+        self.assertValidFlow(gr, s, t, value, flows, cut)
+
+        self.assertEqual(0, graph.maxflow(gr, t, s)[0])
+        with self.assertRaises(graph.GraphException):
+            graph.maxflow(gr, s, s)
+
+    def test_maxflow_random(self):
+        for seed in range(10):
+            gr = graph.gnm(30, 120, cls=graph.DGraph, maxcost=20, seed=seed)
+            s, t = graph.Node(0), graph.Node(29)
+            value, flows, cut = graph.maxflow(gr, s, t)
+            self.assertValidFlow(gr, s, t, value, flows, cut)
+
+    def test_subgraph(self):
+        edges = [('a', 'b', 1), ('b', 'c', 5), ('a', 'c', 9), ('c', 'd', 1), ('e', 'a', 1)]
+        gr = graph.DGraph.fromedges(edges)
+        a, b, c, d, e = [graph.Node(x) for x in 'abcde']
+
+        cheap = graph.subgraph(gr, maxcost=5)
+        self.assertTrue(isinstance(cheap, graph.DSubgraphView))
+        self.assertEqual(5, len(cheap))
+        self.assertEqual((7, [a, b, c, d]), cheap.shortestpath(a, d))
+        self.assertEqual((7, [a, b, c, d]), cheap.bidijkstra(a, d))
+        self.assertEqual(set([(a, b, 1), (b, c, 5), (c, d, 1), (e, a, 1)]), set(cheap.arcs()))
+        with self.assertRaises(graph.GraphException):
+            cheap.addedge(a, d)
+
+        # changes to the parent show through, even in the reverse index
+        gr.addedge(d, e, 2)
+        self.assertEqual(2, cheap.bidijkstra(d, e)[0])
+        self.assertEqual(set([d]), set(u for u, cost in cheap._reverseadjacency()[e]))
+
+        odd = graph.subgraph(gr, nodes=[a, b, c], keep=lambda x, y, cost: cost % 2 == 1)
+        self.assertEqual([(a, b, 1), (a, c, 9), (b, c, 5)], sorted(odd.arcs()))
+        self.assertEqual(['a', 'b', 'c', 'd', 'e'], sorted(str(n) for n in graph.componentview(gr, c).nodes()))
+
+        # views of views, and copying out
+        view = graph.subgraph(cheap, nodes=[a, b, c])
+        self.assertEqual([(a, b, 1), (b, c, 5)], sorted(view.arcs()))
+        for copy in (view.materialize(), view.compact()):
+            self.assertFalse(isinstance(copy, graph.UGraph))
+            self.assertEqual(sorted(view.arcs()), sorted(copy.arcs()))
+        self.assertTrue(isinstance(view.compact(), graph.CompactDGraph))
+        with self.assertRaises(graph.GraphException):
+            graph.subgraph(gr, nodes=[graph.Node('z')])
+
+    def test_predecessors(self):
+        edges = [('a', 'b', 1), ('c', 'b', 2), ('b', 'd', 3), ('d', 'b', 4), ('a', 'd', 5)]
+        a, b, c, d = [graph.Node(x) for x in 'abcd']
+        for track in (False, True):
+            gr = graph.DGraph.fromedges(edges)
+            if track:
+                gr.trackpredecessors()
+            self.assertEqual([a, c, d], list(gr.predecessors(b)))
+            self.assertEqual(0, gr.indegree(a))
+            self.assertEqual('dabc', graph.dfs(gr.reversed(), d))
+            self.assertEqual({d: 0, b: 3, a: 4, c: 5}, gr.reversed().dijkstra(d)[0])
+
+            e = graph.Node('e')
+            gr.addnode(e)
+            gr.addedge(e, b, 7)
+            gr.addedges([('f', 'a')])
+            gr.updatecost(c, b, 1)
+            gr.removeedge(d, b)
+            self.assertEqual([a, c, e], list(gr.predecessors(b)))
+            self.assertEqual({b: 0, a: 1, c: 1, e: 7, graph.Node('f'): 2}, gr.reversed().dijkstra(b)[0])
+            gr.removenode(a)
+            self.assertEqual([c, e], list(gr.predecessors(b)))
+            self.assertEqual([b], list(gr.predecessors(d)))
+            self.assertEqual(0, gr.indegree(graph.Node('f')))
+            self.assertEqual((4, [c, b, d]), gr.bidijkstra(c, d))
+
+        with self.assertRaises(graph.GraphException):
+            gr.indegree(a)
+        with self.assertRaises(graph.GraphException):
+            gr.reversed().addedge(b, c)
+
+        # a tracked index stays the same as one built from scratch
+        gr = graph.gnm(100, 400, cls=graph.DGraph, maxcost=5, seed=3)
+        gr.trackpredecessors()
+        rnd = random.Random(3)
+        for _ in range(200):
+            x, y = graph.Node(rnd.randrange(100)), graph.Node(rnd.randrange(100))
+            if not gr.contains(x) or not gr.contains(y):
+                continue
+            if rnd.random() < 0.6:
+                gr.addedge(x, y, rnd.randint(1, 5))
+            elif y in [arc[0] for arc in gr.adj_list[x]]:
+                gr.removeedge(x, y) if rnd.random() < 0.5 else gr.updatecost(x, y, 9)
+            elif rnd.random() < 0.1:
+                gr.removenode(x)
+        fresh = graph.DGraph.fromedges(list(gr.arcs()), nodes=[n.label for n in gr.nodes()])
+        for n in gr.nodes():
+            self.assertEqual(sorted(fresh._reverseadjacency()[n]), sorted(gr._reverseadjacency()[n]))
+
+    def test_scc_deep(self):
+        # a long cycle would blow the recursion limit for a recursive tarjan
+        n = 20000
+        gr = graph.DGraph.fromedges([(i, (i + 1) % n) for i in range(n)])
+        self.assertEqual(1, len(graph.scc(gr)))
+        gr = graph.DGraph.fromedges([(i, i + 1) for i in range(n)])
+        self.assertEqual(n + 1, len(graph.scc(gr)))
+
+    def test_version(self):
+        gr = graph.DGraph()
+        self.assertEqual(0, gr.version)
+        a = graph.Node('a')
+        b = graph.Node('b')
+        gr.addnodes(a, b)
+        v = gr.version
+        gr.addedge(a, b)
+        self.assertTrue(gr.version > v)
+        v = gr.version
+        gr.addedges([(b, a)])
+        self.assertTrue(gr.version > v)
+        v = gr.version
         gr.dijkstra(a)
+        list(gr.edges())
+        self.assertEqual(v, gr.version)
+
+    def test_pathcache(self):
+        gr = graph.DGraph.fromedges([(1, 2, 10), (1, 4, 30), (2, 3, 50), (4, 3, 20)])
+        one, two, three, four = [graph.Node(x) for x in (1, 2, 3, 4)]
+        cache = graph.PathCache(gr, maxsize=2)
+
+        self.assertEqual(gr.dijkstra(one), cache.dijkstra(one))
+        self.assertEqual((50, [one, four, three]), cache.shortestpath(one, three))
+        self.assertEqual({'hits': 1, 'misses': 1, 'evictions': 0, 'invalidations': 0, 'size': 1, 'maxsize': 2},
+                         cache.stats())
+
+        # least recently used goes first
+        cache.dijkstra(two)
+        cache.dijkstra(one)
+        cache.dijkstra(three)
+        self.assertEqual(1, cache.evictions)
+        cache.dijkstra(one)
+        self.assertEqual(3, cache.hits)
+
+        # changing the graph throws everything away
+        gr.addedge(one, three, 5)
+        self.assertEqual((5, [one, three]), cache.shortestpath(one, three))
+        self.assertEqual(2, cache.invalidations)
+        self.assertEqual(1, len(cache))
+
+    def test_allpairs(self):
+        gr = graph.DGraph.fromedges([(1, 2, 10), (1, 4, 30), (1, 5, 100), (2, 3, 50), (3, 5, 10), (4, 5, 60),
+                                     (4, 3, 20)])
+        expected = dict((n, gr.dijkstra(n)[0]) for n in gr.nodes())
+
+        self.assertEqual(expected, dict(graph.allpairs(gr, processes=1, method='dijkstra')))
+        self.assertEqual(expected, dict(graph.allpairs(gr, processes=2, method='dijkstra')))
+        self.assertEqual(expected, dict(graph.allpairs(gr, method='floyd')))
+        # small and dense enough to get floyd-warshall
+        self.assertEqual(expected, dict(graph.allpairs(gr)))
+
+        one = graph.Node(1)
+        self.assertEqual([(one, expected[one])], list(graph.allpairs(gr, sources=[one], method='floyd')))
+
+        with self.assertRaises(graph.GraphException):
+            graph.allpairs(gr, sources=[graph.Node(9)])
+        with self.assertRaises(graph.GraphException):
+            graph.allpairs(gr, method='bogus')
+
+    def test_shortestpath(self):
+        a = graph.Node('1')
+        b = graph.Node('2')
+        c = graph.Node('3')
+        d = graph.Node('4')
+        e = graph.Node('5')
+
+        gr = graph.DGraph()
+        gr.addnodes(a, b, c, d, e)
+        gr.addedge(a, b, 10)
+        gr.addedge(a, d, 30)
+        gr.addedge(a, e, 100)
+        gr.addedge(b, c, 50)
+        gr.addedge(c, e, 10)
+        gr.addedge(d, e, 60)
+        gr.addedge(d, c, 20)
 
+        self.assertEqual((50, [a, d, c]), gr.shortestpath(a, c))
+        self.assertEqual((0, [b]), gr.shortestpath(b, b))
+        self.assertEqual((None, []), gr.shortestpath(e, a))
+
+        # stopping early at c means e is never settled
+        dist, pred = gr.dijkstra(a, target=c)
+        self.assertEqual(50, dist[c])
+        self.assertFalse(e in dist)
+        self.assertFalse(e in pred)
+
+
+
+class TestCompact(unittest.TestCase):
+
+    def setUp(self):
+        self.nodes = [graph.Node(x) for x in 'abcdefgh']
+        a, b, c, d, e, f, g, h = self.nodes
+
+        gr = graph.UGraph()
+        gr.addnodes(*self.nodes)
+        gr.addedge(a, b, 3)
+        gr.addedge(a, g, 1)
+        gr.addedge(a, d, 4)
+        gr.addedge(b, e, 2)
+        gr.addedge(b, f, 6)
+        gr.addedge(c, f, 1)
+        gr.addedge(c, h, 5)
+        gr.addedge(d, f, 2)
+        gr.addedge(e, g, 1)
+        self.ugraph = gr
+
+    def test_readonly(self):
+        cg = self.ugraph.compact()
+        self.assertTrue(isinstance(cg, graph.UGraph))
+        with self.assertRaises(graph.GraphException):
+            cg.addnode(graph.Node('z'))
+        with self.assertRaises(graph.GraphException):
+            cg.addedge(self.nodes[0], self.nodes[1])
+
+    def test_same_results(self):
+        a = self.nodes[0]
+        cg = self.ugraph.compact()
+        self.assertEqual(len(self.ugraph), len(cg))
+        self.assertEqual(list(self.ugraph.neighbors(a)), list(cg.neighbors(a)))
+        self.assertEqual(set(self.ugraph.edges()), set(cg.edges()))
+        self.assertEqual(graph.dfs(self.ugraph, a), graph.dfs(cg, a))
+        self.assertEqual(graph.bfs(self.ugraph, a), graph.bfs(cg, a))
+        self.assertEqual(self.ugraph.dijkstra(a)[0], cg.dijkstra(a)[0])
+        self.assertEqual(set(graph.kruskal(self.ugraph).edges()), set(graph.kruskal(cg).edges()))
+
+    def test_fromedges(self):
+        edges = [(e.origin, e.terminus, e.cost) for e in self.ugraph.edges()]
+        cg = graph.CompactUGraph.fromedges(edges, nodes=['z'])
+        self.assertEqual(len(self.ugraph) + 1, len(cg))
+        self.assertEqual(set(self.ugraph.edges()), set(cg.edges()))
+        self.assertEqual([], cg.adj_list[graph.Node('z')])
+        with self.assertRaises(graph.GraphException):
+            cg.addedges(edges)
+
+    def test_save_load(self):
+        a = self.nodes[0]
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'g.bin')
+            graph.save(self.ugraph, path)
+            loaded = graph.load(path)
+            self.assertTrue(isinstance(loaded, graph.CompactUGraph))
+            self.assertEqual(len(self.ugraph), len(loaded))
+            self.assertEqual(set(self.ugraph.edges()), set(loaded.edges()))
+            self.assertEqual(graph.dfs(self.ugraph, a), graph.dfs(loaded, a))
+            self.assertEqual(self.ugraph.dijkstra(a), loaded.dijkstra(a))
+
+            # a loaded graph can be saved again
+            graph.save(loaded, path + '2')
+            self.assertEqual(set(loaded.edges()), set(graph.load(path + '2').edges()))
+
+            d = graph.DGraph.fromedges([('x', 'y', 0.5)])
+            graph.save(d, path)
+            loaded = graph.load(path)
+            self.assertTrue(isinstance(loaded, graph.CompactDGraph))
+            self.assertEqual([(graph.Node('y'), 0.5)], loaded.adj_list[graph.Node('x')])
+
+            with open(path, 'wb') as f:
+                f.write('not a graph at all, no sir' * 4)
+            with self.assertRaises(graph.GraphException):
+                graph.load(path)
+            open(path, 'wb').close()
+            with self.assertRaises(graph.GraphException):
+                graph.load(path)
+
+            # costs that don't fit the format
+            for cost in ('x', 2 ** 64):
+                with self.assertRaises(graph.GraphException):
+                    graph.save(graph.DGraph.fromedges([('x', 'y', cost)]), path)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_directed(self):
+        a, b, c = self.nodes[:3]
+        gr = graph.DGraph()
+        gr.addnodes(a, b, c)
+        gr.addedge(a, b, 0.5)
+        gr.addedge(b, c, 0.25)
+        cg = gr.compact()
+        self.assertTrue(isinstance(cg, graph.CompactDGraph))
+        self.assertEqual([(b, 0.5)], cg.adj_list[a])
+        self.assertEqual([], cg.adj_list[c])
+        self.assertEqual((0.75, [a, b, c]), cg.shortestpath(a, c))
 
 
 #class TestMultipleEdges(unittest.TestCase):
@@ -250,6 +895,25 @@ class TestUGraph(unittest.TestCase):
 
         self.assertEqual('bcdefgh', k)
 
+    def test_sorting_after_addedge(self):
+        # the sorted neighbor lists are cached; adding an edge has to show up in them
+        gr = graph.UGraph()
+        a = graph.Node('a')
+        b = graph.Node('b')
+        c = graph.Node('c')
+        d = graph.Node('d')
+        gr.addnodes(a, b, c, d)
+
+        gr.addedge(a, d)
+        gr.addedge(a, b)
+        self.assertEqual([b, d], list(gr.neighbors(a)))
+        self.assertEqual('abd', graph.dfs(gr, a))
+
+        gr.addedge(a, c)
+        self.assertEqual([b, c, d], list(gr.neighbors(a)))
+        self.assertEqual([a], list(gr.neighbors(c)))
+        self.assertEqual('abcd', graph.dfs(gr, a))
+
     def test_dfs(self):
 
         # cf. https://www.youtube.com/watch?v=zLZhSSXAwxI
@@ -335,6 +999,71 @@ class TestUGraph(unittest.TestCase):
         r = graph.bfs(gr, a)
         self.assertEqual('abdgefch', r)
 
+    def test_iterators(self):
+        gr = graph.UGraph()
+        a = graph.Node('a')
+        b = graph.Node('b')
+        c = graph.Node('c')
+        d = graph.Node('d')
+        gr.addnodes(a, b, c, d)
+        gr.addedge(a, b)
+        gr.addedge(a, c)
+        gr.addedge(b, d)
+
+        # bad start nodes are reported right away, not on the first next()
+        with self.assertRaises(graph.GraphException):
+            graph.iterdfs(gr, graph.Node('mr_lonely'))
+        with self.assertRaises(graph.GraphException):
+            graph.iterbfs(gr, graph.Node('mr_lonely'))
+
+        self.assertEqual([a, b, d, c], list(graph.iterdfs(gr, a)))
+        self.assertEqual([(a, 0, None), (b, 1, a), (d, 2, b), (c, 1, a)], list(graph.iterdfs(gr, a, details=True)))
+
+        self.assertEqual([a, b, c, d], list(graph.iterbfs(gr, a)))
+        self.assertEqual([(a, 0, None), (b, 1, a), (c, 1, a), (d, 2, b)], list(graph.iterbfs(gr, a, details=True)))
+        self.assertEqual(list(graph.iterbfs(gr, a, details=True)),
+                         list(graph.iterbfs_zigzag(gr, a, details=True)))
+
+        # callers can stop whenever they like
+        it = graph.iterbfs(gr, d)
+        self.assertEqual(d, next(it))
+        self.assertEqual(b, next(it))
+
+    def test_bfslevels(self):
+        a, b, c, d, h = [graph.Node(x) for x in 'abcdh']
+        levels = graph.bfslevels(self.sedgewick, [a])
+        self.assertEqual(7, len(levels))
+        self.assertEqual(0, levels[a])
+        self.assertEqual(1, levels[b])
+        self.assertEqual(2, levels[d])
+
+        levels = graph.bfslevels(self.sedgewick, [d, h])
+        self.assertEqual(9, len(levels))
+        self.assertEqual(0, levels[h])
+        self.assertEqual(1, levels[graph.Node('i')])
+        self.assertEqual(2, levels[a])
+        self.assertEqual(3, levels[b])
+
+        with self.assertRaises(graph.GraphException):
+            graph.bfslevels(self.sedgewick, [graph.Node('mr_lonely')])
+
+    def test_multibfs(self):
+        g = graph.gnm(60, 90, seed=11)
+        rng = random.Random(11)
+        seedsets = [rng.sample(sorted(g.nodes()), rng.randint(1, 3)) for _ in range(10)]
+        expected = [graph.bfslevels(g, seeds) for seeds in seedsets]
+
+        # each seed set on its own agrees with a plain bfs
+        for seeds, levels in zip(seedsets, expected):
+            if len(seeds) == 1:
+                self.assertEqual(set(levels), set(graph.iterbfs(g, seeds[0])))
+                for n, depth, parent in graph.iterbfs(g, seeds[0], details=True):
+                    self.assertEqual(depth, levels[n])
+
+        self.assertEqual(expected, list(graph.multibfs(g, seedsets, processes=1)))
+        self.assertEqual(expected, list(graph.multibfs(g, seedsets, processes=1, batchsize=3)))
+        self.assertEqual(expected, list(graph.multibfs(g, seedsets, processes=2, batchsize=4)))
+
     def test_getpartitions(self):
         # sedgewick, p. 374
 
@@ -348,10 +1077,69 @@ class TestUGraph(unittest.TestCase):
             results.append(r)
         self.assertEqual(['abcdefg', 'hi', 'jklm'], sorted(results))
 
+    def test_componentlabels(self):
+        labels, sizes = graph.componentlabels(self.sedgewick)
+        self.assertEqual([2, 4, 7], sorted(sizes))
+        self.assertEqual(13, len(labels))
+        self.assertEqual(labels[graph.Node('a')], labels[graph.Node('e')])
+        self.assertEqual(labels[graph.Node('j')], labels[graph.Node('m')])
+        self.assertNotEqual(labels[graph.Node('a')], labels[graph.Node('h')])
+
+    def test_getpartitions_views(self):
+        views = graph.getpartitions(self.sedgewick, views=True)
+        results = []
+        for v in views:
+            with self.assertRaises(graph.GraphException):
+                v.addnode(graph.Node('z'))
+            nd = next(iter(v.nodes()))
+            results.append(''.join(sorted(graph.dfs(v, nd))))
+        self.assertEqual(['abcdefg', 'hi', 'jklm'], sorted(results))
+
+        # the views see changes to the parent
+        smallest = min(views, key=len)
+        h = graph.Node('h')
+        self.assertEqual([graph.Node('i')], list(smallest.neighbors(h)))
+        self.sedgewick.addedge(h, graph.Node('i'), 5)
+        self.assertEqual([graph.Node('i'), graph.Node('i')], list(smallest.neighbors(h)))
+
+        copy = smallest.materialize()
+        self.assertEqual(set(smallest.edges()), set(copy.edges()))
+        copy.addedge(h, graph.Node('i'))
+
+        # arcs leaving the node set are hidden
+        v = graph.SubgraphView(self.sedgewick, [graph.Node('a'), graph.Node('b'), graph.Node('c')])
+        self.assertEqual('abc', graph.bfs(v, graph.Node('a')))
+        self.assertEqual([graph.Node('a')], list(v.neighbors(graph.Node('b'))))
+
+    def test_trackcomponents(self):
+        gr = self.sedgewick
+        components = gr.trackcomponents()
+        self.assertEqual(3, components.count)
+        self.assertTrue(components.connected(graph.Node('a'), graph.Node('e')))
+        self.assertFalse(components.connected(graph.Node('a'), graph.Node('h')))
+
+        gr.addedge(graph.Node('a'), graph.Node('h'))
+        self.assertEqual(2, components.count)
+        self.assertTrue(components.connected(graph.Node('i'), graph.Node('e')))
+
+        n = graph.Node('n')
+        gr.addnode(n)
+        self.assertEqual(3, components.count)
+        self.assertTrue(gr.trackcomponents() is components)
+
     def test_edges(self):
         for e in self.sedgewick.edges():
             print e
 
+        arcs = list(self.sedgewick.arcs())
+        self.assertEqual(12, len(arcs))
+        self.assertEqual(set((e.origin, e.terminus, e.cost) for e in self.sedgewick.edges()), set(arcs))
+        self.assertTrue((graph.Node('a'), graph.Node('b'), 1) in arcs)
+
+        d = graph.DGraph.fromedges([('a', 'b', 2), ('b', 'a', 3)])
+        self.assertEqual(set([(graph.Node('a'), graph.Node('b'), 2), (graph.Node('b'), graph.Node('a'), 3)]),
+                         set(d.arcs()))
+
     def test_zigzag(self):
         gr = graph.UGraph()
         a = graph.Node('a')
@@ -412,3 +1200,192 @@ class TestUGraph(unittest.TestCase):
         mst = graph.kruskal(gr)
         for ex in mst.edges():
             print ex
+
+        self.assertEqual(7, len(mst))
+        self.assertEqual(6, len(list(mst.edges())))
+        self.assertEqual(39, sum(ex.cost for ex in mst.edges()))
+
+    def test_prim(self):
+        edges = [('a', 'd', 5), ('a', 'b', 7), ('b', 'c', 8), ('b', 'd', 9), ('b', 'e', 7), ('c', 'e', 5),
+                 ('d', 'e', 15), ('d', 'f', 6), ('f', 'e', 8), ('e', 'g', 9), ('f', 'g', 11)]
+        gr = graph.UGraph.fromedges(edges)
+        tree = graph.prim(gr)
+        self.assertTrue(isinstance(tree, graph.UGraph))
+        self.assertEqual(7, len(tree))
+        self.assertEqual(6, len(list(tree.edges())))
+        self.assertEqual(39, sum(ex.cost for ex in tree.edges()))
+        self.assertEqual(set(graph.kruskal(gr).edges()), set(tree.edges()))
+        self.assertEqual(39, sum(ex.cost for ex in graph.mst(gr).edges()))
+
+        forest = graph.prim(self.sedgewick)
+        self.assertEqual(13, len(forest))
+        self.assertEqual(10, len(list(forest.edges())))
+        with self.assertRaises(graph.GraphException):
+            graph.prim(self.sedgewick, forest=False)
+
+        # dense enough that mst goes with prim
+        dense = graph.UGraph.fromedges([(x, y, (x * 7 + y * 3) % 11) for x in range(12) for y in range(x)])
+        self.assertEqual(sum(ex.cost for ex in graph.kruskal(dense).edges()),
+                         sum(ex.cost for ex in graph.mst(dense).edges()))
+
+    def test_kruskal_forest(self):
+        mst = graph.kruskal(self.sedgewick)
+        self.assertEqual(13, len(mst))
+        # 13 nodes in 3 components
+        self.assertEqual(10, len(list(mst.edges())))
+        self.assertEqual(3, len(graph.getpartitions(mst)))
+
+    def test_instrumentation(self):
+        a = graph.Node('a')
+        with graph.instrumented() as stats:
+            self.assertEqual('abcfdeg', graph.dfs(self.sedgewick, a))
+            graph.bfs(self.sedgewick, a)
+            self.sedgewick.dijkstra(a)
+            graph.getpartitions(self.sedgewick)
+            graph.kruskal(self.sedgewick)
+        self.assertEqual({'settled': 7, 'relaxed': 14, 'sorts': 7}, stats.counters['dfs'])
+        # the sorted neighbor lists are cached by now
+        self.assertEqual({'settled': 7, 'relaxed': 14, 'sorts': 0}, stats.counters['bfs'])
+        self.assertEqual({'settled': 7, 'relaxed': 14, 'pushes': 7}, stats.counters['dijkstra'])
+        self.assertEqual({'settled': 13, 'relaxed': 24, 'components': 3}, stats.counters['getpartitions'])
+        self.assertEqual({'sorts': 1, 'edges': 12, 'unions': 12, 'merges': 10}, stats.counters['kruskal'])
+        self.assertEqual(1, stats.calls['dfs'])
+        self.assertTrue(stats.seconds['dijkstra'] >= 0)
+        self.assertTrue('kruskal' in stats.report())
+
+        # any callable will do, and nothing is reported once it's uninstalled
+        calls = []
+        previous = graph.instrument(lambda name, counters, seconds: calls.append(name))
+        self.assertEqual(None, previous)
+        self.sedgewick.shortestpath(a, graph.Node('e'))
+        list(graph.iterbfs_zigzag(self.sedgewick, a, details=True))
+        graph.instrument(None)
+        graph.dfs(self.sedgewick, a)
+        self.assertEqual(['dijkstra', 'bfs_zigzag'], calls)
+
+        with graph.instrumented() as stats:
+            self.assertEqual(2, self.sedgewick.astar(a, graph.Node('e'), lambda n, target: 0)[0])
+            graph.kruskal(graph.UGraph())
+        self.assertEqual(1, stats.calls['astar'])
+        self.assertEqual({'sorts': 1, 'edges': 0, 'unions': 0, 'merges': 0}, stats.counters['kruskal'])
+
+        # a search that fails reaches everything in a's component, and empties the heap
+        with graph.instrumented() as stats:
+            self.assertEqual(None, self.sedgewick.astar(a, graph.Node('h'), lambda n, target: 0)[0])
+        counters = stats.counters['astar']
+        self.assertEqual(7, counters['reached'])
+        self.assertEqual(counters['pushes'], counters['pops'])
+
+        # a traversal reports to the observer that was installed when it was made, even if it's used up later
+        with graph.instrumented() as stats:
+            it = graph.iterdfs(self.sedgewick, a)
+        self.assertEqual(None, graph.instrument(None))
+        self.assertEqual(7, len(list(it)))
+        self.assertEqual({'settled': 7, 'relaxed': 14, 'sorts': 0}, stats.counters['dfs'])
+
+
+class TestGenerators(unittest.TestCase):
+
+    def assertSimple(self, g):
+        # no self-loops, no parallel edges
+        pairs = [(e.origin, e.terminus) for e in g.edges()]
+        self.assertEqual(len(pairs), len(set(pairs)))
+        self.assertFalse(any(a == b for a, b in pairs))
+
+    def test_gnp(self):
+        self.assertEqual(45, len(list(graph.gnp(10, 1).edges())))
+        self.assertEqual(90, len(list(graph.gnp(10, 1, cls=graph.DGraph).edges())))
+        self.assertEqual(0, len(list(graph.gnp(10, 0).edges())))
+
+        g = graph.gnp(300, 0.05, seed=7)
+        self.assertEqual(300, len(g))
+        self.assertSimple(g)
+        # expect about 2242 edges
+        self.assertTrue(1900 < len(list(g.edges())) < 2600)
+        self.assertEqual(set(g.edges()), set(graph.gnp(300, 0.05, seed=7).edges()))
+
+        d = graph.gnp(100, 0.1, cls=graph.DGraph, seed=7)
+        self.assertSimple(d)
+
+    def test_gnm(self):
+        g = graph.gnm(50, 200, maxcost=9, seed=3)
+        self.assertEqual(50, len(g))
+        self.assertEqual(200, len(list(g.edges())))
+        self.assertSimple(g)
+        self.assertTrue(all(1 <= e.cost <= 9 for e in g.edges()))
+
+        d = graph.gnm(20, 300, cls=graph.CompactDGraph, seed=3)
+        self.assertEqual(300, len(list(d.edges())))
+        self.assertSimple(d)
+
+        # the compact graphs have proper nodes too, and the same edges as the dict-based ones
+        for cls in (graph.CompactUGraph, graph.CompactDGraph):
+            c = graph.gnm(50, 200, cls=cls, maxcost=9, seed=2)
+            self.assertTrue(all(isinstance(n, graph.Node) for n in c.nodes()))
+            self.assertTrue(all(isinstance(arc[0], graph.Node) for n in c.nodes() for arc in c.adj_list[n]))
+            plain = graph.gnm(50, 200, cls=graph.UGraph if cls is graph.CompactUGraph else graph.DGraph, maxcost=9,
+                              seed=2)
+            self.assertEqual(graph.dfs(plain, graph.Node(0)), graph.dfs(c, graph.Node(0)))
+            self.assertEqual(plain.dijkstra(graph.Node(0))[0], c.dijkstra(graph.Node(0))[0])
+
+        self.assertEqual(45, len(list(graph.gnm(10, 45).edges())))
+        with self.assertRaises(graph.GraphException):
+            graph.gnm(10, 46)
+
+    def test_barabasi_albert(self):
+        g = graph.barabasi_albert(200, 3, seed=1)
+        self.assertEqual(200, len(g))
+        self.assertEqual(197 * 3, len(list(g.edges())))
+        self.assertSimple(g)
+        self.assertEqual(1, len(graph.getpartitions(g)))
+
+    def test_gridgraph(self):
+        g = graph.gridgraph(3, 4)
+        self.assertEqual(12, len(g))
+        self.assertEqual(17, len(list(g.edges())))
+        cost, path = g.shortestpath(graph.Node(0), graph.Node(11))
+        self.assertEqual(5, cost)
+        self.assertEqual(6, len(path))
+
+    def test_geometric(self):
+        g = graph.geometric(200, 0.1, seed=5)
+        self.assertEqual(200, len(g))
+        self.assertSimple(g)
+        self.assertTrue(all(0 < e.cost <= 0.1 for e in g.edges()))
+
+        # same graph as checking every pair
+        rng = random.Random(5)
+        points = [(rng.random(), rng.random()) for _ in range(200)]
+        expected = set()
+        for i in range(200):
+            for j in range(i):
+                if (points[i][0] - points[j][0]) ** 2 + (points[i][1] - points[j][1]) ** 2 <= 0.01:
+                    expected.add((j, i))
+        self.assertEqual(expected, set((e.origin.label, e.terminus.label) for e in g.edges()))
+
+
+class TestDisjointSet(unittest.TestCase):
+
+    def test_union_find(self):
+        ds = graph.DisjointSet('abcde')
+        self.assertEqual(5, ds.count)
+        self.assertEqual(5, len(ds))
+        self.assertTrue('a' in ds)
+        self.assertFalse('z' in ds)
+
+        self.assertTrue(ds.union('a', 'b'))
+        self.assertTrue(ds.union('c', 'd'))
+        self.assertFalse(ds.union('b', 'a'))
+        self.assertEqual(3, ds.count)
+        self.assertTrue(ds.connected('a', 'b'))
+        self.assertFalse(ds.connected('a', 'c'))
+
+        self.assertTrue(ds.union('b', 'd'))
+        self.assertEqual(ds.find('a'), ds.find('c'))
+        self.assertEqual([['a', 'b', 'c', 'd'], ['e']], sorted(sorted(x) for x in ds.sets()))
+
+        ds.add('a')
+        self.assertEqual(2, ds.count)
+
+        with self.assertRaises(graph.GraphException):
+            ds.find('z')